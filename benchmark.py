@@ -0,0 +1,398 @@
+"""
+Headless highlighting benchmark, out of Maya (offscreen Qt platform). May be run
+with Python3 :
+
+    python benchmark.py --sizes 1000 10000 100000 --output results.json
+    python benchmark.py --compare old_results.json new_results.json
+
+Each highlighter gets generated corpora of increasing sizes, seeded from the
+palettes' sample files and the package's own sources. Lines per second, time to
+first paint and peak memory are reported, and written as JSON.
+"""
+
+import os
+import re
+import sys
+import glob
+import json
+import time
+import platform
+import datetime
+import argparse
+
+# (must be set before QApplication creation)
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from PySide2 import QtWidgets, QtCore
+
+try:
+    import tracemalloc
+except ImportError:
+    # Python 2
+    tracemalloc = None
+
+try:
+    import resource
+except ImportError:
+    # Windows
+    resource = None
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if not ROOT in sys.path:
+    sys.path.append(ROOT)
+
+from custom_script_editor import constants as kk
+from custom_script_editor import syntax_highlight
+from custom_script_editor import grammar
+
+
+PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+PALETTES_DIR = os.path.join(PACKAGE_DIR, 'palettes')
+
+DEFAULT_SIZES = [1000, 10000, 100000]
+
+# benchmarked highlighters : (class, init kwargs, sample files language)
+HIGHLIGHTERS = {
+    'python': (syntax_highlight.PythonHighlighter, {'engine': 'regex'}, 'python'),
+    'python_tokenizer': (syntax_highlight.PythonHighlighter, {'engine': 'tokenizer'}, 'python'),
+    'mel': (syntax_highlight.MelHighlighter, {}, 'mel'),
+    'log': (syntax_highlight.LogHighlighter, {}, 'log'),
+}
+
+# identifiers and numbers (not followed by a string, like u'' prefixes), renamed
+# in repeated seed lines (see generate_corpus)
+TOKEN_PATTERN = re.compile('\\b([A-Za-z_]\\w*|\\d+)\\b(?![\'"])')
+
+# seconds after which a lazy highlighter's idle-time highlight is abandoned
+DRAIN_TIMEOUT = 600
+
+
+def get_seed_lines(language):
+    """
+    Args:
+        language (str) : 'python', 'mel' or 'log'
+
+    Returns:
+        (list[str])
+
+    Get <language>'s sample file lines. Python and log corpora also get the
+    package's sources (the log panel shows Python code and tracebacks).
+    """
+
+    paths = [os.path.join(PALETTES_DIR, language, 'sample.txt')]
+    if language in ('python', 'log'):
+        paths += sorted(glob.glob(os.path.join(PACKAGE_DIR, '*.py')))
+        paths += sorted(glob.glob(os.path.join(PACKAGE_DIR, 'tools', '*.py')))
+
+    lines = []
+    for path in paths:
+        with open(path, 'r') as opened_file:
+            lines.extend(opened_file.read().splitlines())
+
+    return lines
+
+def get_grammar_words(language):
+    """
+    Args:
+        language (str) : 'python', 'mel' or 'log'
+
+    Returns:
+        (set[str]) : words <language>'s rules match literally (keywords,
+                     builtins, and words of patterns like 'self' or 'proc')
+    """
+
+    compiled = grammar.get_grammar(language) or {}
+
+    words = set()
+    for table in grammar.RULES_TABLES:
+        for rule in compiled.get(table, ()):
+            words.update(rule.get('words', ()))
+            # (escapes like \b or \w are not words)
+            pattern = re.sub('\\\\.', ' ', rule.get('pattern') or '')
+            words.update(re.findall('[A-Za-z_]\\w*', pattern))
+
+    return words
+
+def generate_corpus(language, count):
+    """
+    Args:
+        language (str) : 'python', 'mel' or 'log'
+        count (int) : lines count
+
+    Returns:
+        (str)
+
+    Repeat <language>'s seed lines up to <count> lines. Python and MEL
+    repetitions get their identifiers and numbers suffixed with the repetition
+    index (but the words rules match literally), so large corpora are not
+    mostly span cache hits, as scripts do not repeat themselves. Log lines are
+    repeated unchanged, as in real repetitive logs.
+    """
+
+    seed_lines = get_seed_lines(language)
+    repeats = count //len(seed_lines) +1
+
+    if language == 'log':
+        lines = seed_lines *repeats
+        return '\n'.join(lines[:count])
+
+    words = get_grammar_words(language)
+
+    lines = list(seed_lines)
+    for i in range(1, repeats):
+        suffix = str(i)
+
+        def rename(match):
+            token = match.group(1)
+            return token if token in words else token +suffix
+
+        lines.extend(TOKEN_PATTERN.sub(rename, line) for line in seed_lines)
+        if len(lines) >= count:
+            break
+
+    return '\n'.join(lines[:count])
+
+def get_max_rss():
+    """
+    Returns:
+        (int or None) : process' peak resident memory, in KB
+    """
+
+    if resource is None:
+        return None
+
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        # (bytes on macOS)
+        return max_rss //1024
+    return max_rss
+
+def is_highlighting(highlighter):
+    """
+    Args:
+        highlighter (syntax_highlight.CustomHighlighter)
+
+    Returns:
+        (bool) : whether idle-time or time-sliced highlight is still running
+    """
+
+    lazy = highlighter.lazy
+    if lazy and lazy.next_number is not None:
+        return True
+
+    append = highlighter.append
+    if append and append.is_pending():
+        return True
+
+    return highlighter.rehighlight_job.is_running()
+
+def run_benchmark(app, name, count, trace_memory=False):
+    """
+    Args:
+        app (QtWidgets.QApplication)
+        name (str) : HIGHLIGHTERS key
+        count (int) : lines count
+        trace_memory (bool, optional) : trace Python allocations (slows
+                                        highlight down a lot, so timings of
+                                        this run are not relevant)
+
+    Returns:
+        (dict)
+
+    Highlight a <count> lines corpus with a new text edit and highlighter.
+    Time to first paint covers text setting and the first viewport paint;
+    total time goes on until lazy highlight is done. Append highlight is
+    disabled, so every line of the corpus gets highlighted.
+    """
+
+    cls, kwargs, language = HIGHLIGHTERS[name]
+    text = generate_corpus(language, count)
+
+    text_edit = QtWidgets.QTextEdit()
+    text_edit.setObjectName('BenchmarkTextEdit')
+    text_edit.resize(800, 600)
+    text_edit.show()
+    app.processEvents()
+
+    # (the corpus is set in one go : append highlight would take it as a single
+    # burst and only highlight its last APPEND_HIGHLIGHT_BACKLOG lines)
+    append_highlight = kk.APPEND_HIGHLIGHT
+    kk.APPEND_HIGHLIGHT = False
+    try:
+        highlighter = cls(text_edit, **kwargs)
+    finally:
+        kk.APPEND_HIGHLIGHT = append_highlight
+
+    trace_memory = trace_memory and tracemalloc is not None
+    if trace_memory:
+        tracemalloc.start()
+
+    start_time = time.time()
+
+    text_edit.setPlainText(text)
+    text_edit.viewport().repaint()
+    first_paint = time.time() -start_time
+
+    timed_out = False
+    while is_highlighting(highlighter):
+        app.processEvents()
+        time.sleep(0.001)
+
+        if time.time() -start_time > DRAIN_TIMEOUT:
+            timed_out = True
+            break
+
+    total_time = time.time() -start_time
+
+    peak_memory = None
+    if trace_memory:
+        peak_memory = tracemalloc.get_traced_memory()[1] //1024
+        tracemalloc.stop()
+
+    result = {
+        'highlighter': name,
+        'lines': count,
+        'seed_lines': len(get_seed_lines(language)),
+        'first_paint': round(first_paint, 4),
+        'total_time': round(total_time, 4),
+        'lines_per_sec': round(count /max(total_time, 1e-6), 1),
+        'peak_python_memory_kb': peak_memory,
+        'max_rss_kb': get_max_rss(),
+        'timed_out': timed_out,
+    }
+
+    highlighter.setDocument(None)
+    text_edit.deleteLater()
+    app.processEvents()
+
+    return result
+
+def get_environment():
+    """
+    Returns:
+        (dict) : versions and settings the results depend on
+    """
+
+    return {
+        'date': datetime.datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'qt': QtCore.qVersion(),
+        'platform': platform.platform(),
+        'qpa_platform': os.environ.get('QT_QPA_PLATFORM'),
+        'regex_backends': kk.REGEX_BACKENDS,
+        'lazy_highlight': kk.LAZY_HIGHLIGHT,
+        'background_highlight': kk.BACKGROUND_HIGHLIGHT,
+    }
+
+def run_suite(names=None, sizes=None, output=None, memory=True):
+    """
+    Args:
+        names (list[str], optional) : HIGHLIGHTERS keys, all by default
+        sizes (list[int], optional) : lines counts, DEFAULT_SIZES by default
+        output (str, optional) : JSON file path
+        memory (bool, optional) : run each benchmark a second time, for its
+                                  peak Python memory (Python3 only)
+
+    Returns:
+        (dict) : environment and results
+    """
+
+    app = QtWidgets.QApplication.instance() or QtWidgets.QApplication(sys.argv)
+
+    names = names or sorted(HIGHLIGHTERS)
+    sizes = sizes or DEFAULT_SIZES
+
+    results = []
+    for name in names:
+        for count in sizes:
+            result = run_benchmark(app, name, count)
+            if memory:
+                memory_result = run_benchmark(app, name, count, trace_memory=True)
+                result['peak_python_memory_kb'] = memory_result['peak_python_memory_kb']
+
+            results.append(result)
+
+            print (
+                '{highlighter:<18} {lines:>7} lines : {lines_per_sec:>10} lines/s, '
+                'first paint {first_paint:.3f}s, total {total_time:.3f}s, '
+                'peak memory {peak_python_memory_kb} KB'.format(**result)
+            )
+
+    data = {'environment': get_environment(), 'results': results}
+
+    if output:
+        with open(output, 'w') as opened_file:
+            json.dump(data, opened_file, indent=4, sort_keys=True)
+
+    return data
+
+def compare_results(old_path, new_path):
+    """
+    Args:
+        old_path (str) : JSON file written by run_suite
+        new_path (str) : JSON file written by run_suite
+
+    Returns:
+        (list[tuple(str, int, float)]) : highlighter, lines count and
+                                         lines/sec ratio (new /old)
+
+    Print lines/sec ratios of the benchmarks found in both files (below 1.0 is a
+    regression).
+    """
+
+    with open(old_path, 'r') as opened_file:
+        old = json.load(opened_file)
+    with open(new_path, 'r') as opened_file:
+        new = json.load(opened_file)
+
+    old_speeds = dict(
+        ((r['highlighter'], r['lines']), r['lines_per_sec']) for r in old['results']
+    )
+
+    ratios = []
+    for result in new['results']:
+        key = (result['highlighter'], result['lines'])
+        if not old_speeds.get(key):
+            continue
+
+        ratio = result['lines_per_sec'] /old_speeds[key]
+        ratios.append((key[0], key[1], ratio))
+
+        print ('{:<18} {:>7} lines : x{:.2f}'.format(key[0], key[1], ratio))
+
+    return ratios
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Offscreen highlighting benchmark.')
+    parser.add_argument(
+        '--highlighters',
+        nargs='+',
+        choices=sorted(HIGHLIGHTERS),
+        help='highlighters to benchmark (all by default)'
+    )
+    parser.add_argument(
+        '--sizes',
+        nargs='+',
+        type=int,
+        help='corpora lines counts (default: {})'.format(DEFAULT_SIZES)
+    )
+    parser.add_argument('--output', help='JSON results file')
+    parser.add_argument(
+        '--no-memory',
+        action='store_true',
+        help='skip peak memory runs'
+    )
+    parser.add_argument(
+        '--compare',
+        nargs=2,
+        metavar=('OLD', 'NEW'),
+        help='compare two JSON results files instead of running benchmarks'
+    )
+
+    args = parser.parse_args()
+
+    if args.compare:
+        compare_results(*args.compare)
+    else:
+        run_suite(args.highlighters, args.sizes, args.output, not args.no_memory)
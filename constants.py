@@ -2,9 +2,18 @@
 Scripts constant values.
 """
 
+import os
 import string
+import tempfile
 
-from PySide2 import QtCore
+try:
+    from PySide2 import QtCore
+except ImportError:
+    try:
+        from PySide import QtCore
+    except ImportError:
+        # no Qt, for the highlighting core only (see highlight_rules)
+        QtCore = None
 
             #######################################################
             #                        General                      #
@@ -14,6 +23,9 @@ VALID_TABS_REGEX = ['MEL', 'Python', '[\w\-_]+(.py)$']
 CUSTOM_MENU_NAME = 'CustomMenu'
 SNIPPETS_BOX_NAME = 'SnippetBox'
 WORD_WRAP_BOX_NAME = 'WordWrapBox'
+LOG_VIEW_BOX_NAME = 'LogViewBox'
+TOKENIZER_BOX_NAME = 'TokenizerBox'
+PROFILE_BOX_NAME = 'HighlightProfileBox'
 
 INF_HEIGHT = 5000
 INF_WIDTH = 10000
@@ -37,7 +49,7 @@ MOVE_KEYS = [
     QtCore.Qt.Key_Right,
     QtCore.Qt.Key_End,
     QtCore.Qt.Key_Home
-]
+] if QtCore else []
 
 CHARACTERS = string.printable.split(' ')[0] +' '
 # special chars, with accents, etc
@@ -62,6 +74,84 @@ COLLAPSIBLE_PATTERNS = [
             #                   Syntax Highlight                  #
             #######################################################
 
+# default Python tabs highlighting engine ('regex' or 'tokenizer')
+PYTHON_HIGHLIGHT_ENGINE = 'regex'
+
+# script tabs lazy highlight (visible blocks first, the other ones on idle time)
+LAZY_HIGHLIGHT = True
+LAZY_HIGHLIGHT_MARGIN = 50          # blocks highlighted around the visible ones
+LAZY_HIGHLIGHT_CHUNK_TIME = 15      # ms of highlight for each idle-time chunk
+LAZY_HIGHLIGHT_TYPING_PAUSE = 500   # ms without edit before idle highlight goes on
+
+# lazy highlight of large documents, with spans computed by a worker thread
+# (see highlight_scheduler.BackgroundHighlight)
+BACKGROUND_HIGHLIGHT = True
+BACKGROUND_HIGHLIGHT_THRESHOLD = 5000   # blocks count from which a worker is used
+BACKGROUND_HIGHLIGHT_BLOCKS = 5000      # lines snapshotted for each worker
+BACKGROUND_HIGHLIGHT_BATCH = 250        # lines computed between two results
+BACKGROUND_HIGHLIGHT_POLL = 20          # ms before checking worker's results again
+
+# log panel appends highlighted by bursts, once output goes quiet (see
+# highlight_scheduler.AppendHighlight)
+APPEND_HIGHLIGHT = True
+APPEND_HIGHLIGHT_DELAY = 50             # ms without append before a burst gets highlighted
+APPEND_HIGHLIGHT_MAX_DELAY = 500        # ms before highlighting a burst that goes on
+APPEND_HIGHLIGHT_BACKLOG = 5000         # last appended blocks highlighted (older ones stay plain)
+
+# log panel capped to LOG_BUFFER_MAX_BLOCKS blocks, its oldest lines being
+# archived on disk (see log_buffer.LogBuffer, archive reopened from the Custom
+# Menu)
+LOG_BUFFER = True
+LOG_BUFFER_MAX_BLOCKS = 100000          # blocks from which the oldest ones are removed
+LOG_BUFFER_TRIM_BLOCKS = 10000          # blocks removed below the cap, for trims to be rare
+LOG_ARCHIVE = True
+LOG_ARCHIVE_DIR = os.path.join(tempfile.gettempdir(), 'custom_script_editor', 'logs')
+LOG_ARCHIVE_SIZE = 10 *1024 *1024       # bytes from which the archive file gets rotated
+LOG_ARCHIVE_COUNT = 5                   # rotated archive files kept
+
+# virtualized log view, toggled from the Custom Menu (see log_view.LogView)
+LOG_VIEW_MEMORY_LINES = 100000          # lines kept in memory, older ones are spilled to disk
+LOG_VIEW_SPILL_CHUNK = 1000             # lines spilled to disk, and read back, at once
+LOG_VIEW_SPILL_CACHE = 8                # spilled chunks kept in memory once read back
+LOG_VIEW_STATE_LOOKBACK = 200           # lines above a painted row resolving its block state
+LOG_VIEW_FLUSH_DELAY = 50               # ms without append before the view gets new lines
+LOG_VIEW_FLUSH_MAX_DELAY = 500          # ms before the view gets the lines of a burst that goes on
+
+# regex backend for each language ('re', 'qregularexpression' or 'qregexp'),
+# and the ones to use if not available in Maya's build (the fastest one can be
+# found with regex_backend.compare_backends)
+REGEX_BACKENDS = {
+    'python': 're',
+    'mel': 're',
+    'log': 're',
+}
+REGEX_BACKENDS_FALLBACK = ['re']
+
+# lines longer than LONG_LINE_THRESHOLD only get regex rules applied on their
+# first LONG_LINE_PREFIX characters (see highlight_rules.Rule.get_rules_line)
+LONG_LINE_THRESHOLD = 2000
+LONG_LINE_PREFIX = 500
+LINE_TIME_BUDGET = 20               # ms of regex rules for each line
+RUNAWAY_PATTERN_TIME = 100          # ms on a single line before a pattern gets disabled
+REGEX_SAFETY_BUDGET = 10            # ms for each pattern on each fuzzed line (see regex_safety)
+
+# highlighted lines kept as style keys, for each highlighter (see
+# syntax_highlight.SpanCache)
+SPAN_CACHE_SIZE = 20000
+# log lines languages kept by MEL/Python line detectors (see
+# highlight_rules.LineDetector)
+LINE_DETECTOR_CACHE_SIZE = 4096
+
+# compiled grammars cache (see grammar.load_grammar)
+GRAMMAR_CACHE_DIR = os.path.join(tempfile.gettempdir(), 'custom_script_editor', 'grammars')
+
+# record per-pattern statistics of highlighting rules from startup (see
+# highlight_rules.RuleProfile, also toggled from the Custom Menu)
+HIGHLIGHT_PROFILE = False
+
+# rehighlight after a theme/palette change (see highlight_scheduler.RehighlightJob)
+REHIGHLIGHT_SLICE_TIME = 15         # ms of highlight for each time slice
+
 PYTHON_NUMBERS = [
     'None',
     'True',
@@ -0,0 +1,315 @@
+"""
+Declarative grammars of the highlighting rules (grammars/<language>.json).
+
+Each grammar file lists its rules tables ('rules', and 'message_rules' or
+'blocking_rules' for the log panel) and its strings, docstrings and comments
+'delimiters'. A rule entry is one of :
+
+    {"pattern": "regex", "group": 0, "style": "style_name", "requires": "literal"}
+    {"patterns": ["regex", ...], "group": 0, "style": "style_name"}
+    {"words": ["word", ...], "style": "style_name"}
+
+"patterns" and "words" may also name a list from constants (like "OPERATORS"
+or "PYTHON_KEYWORDS"), and "description" keys are ignored. The optional
+"requires" literal, contained in every match, skips lines with no such literal
+(for patterns that may backtrack a lot on lines they can not match, see
+regex_safety).
+
+Grammars are compiled once (see compile_grammar) and the compiled form is
+cached on disk, keyed by a hash of its content, so unchanged grammars are only
+read back.
+"""
+
+import os
+import re
+import json
+import hashlib
+
+from custom_script_editor import constants as kk
+
+
+GRAMMARS_ROOT = os.path.join(os.path.dirname(__file__), 'grammars')
+
+# compiled grammars, by language (see get_grammar)
+GRAMMARS = {}
+# compiled form version, part of the cache key (to bump on compile_grammar changes)
+COMPILER_VERSION = 2
+
+RULES_TABLES = ('rules', 'message_rules', 'blocking_rules')
+DELIMITERS = ('docstrings', 'docstrings_close', 'strings', 'comments')
+# regex special characters, unless escaped (see get_literal)
+REGEX_SPECIALS = '.^$*+?{}[]|()'
+
+
+def get_grammar(language):
+    """
+    Args:
+        language (str) : 'python', 'mel' or 'log' (or any other grammar file)
+
+    Returns:
+        (dict or None) : compiled <language> grammar, with 'rules',
+                         'message_rules', 'blocking_rules' and 'delimiters'
+                         keys, None if there is no such grammar file
+    """
+
+    if not language in GRAMMARS:
+        GRAMMARS[language] = load_grammar(language)
+
+    return GRAMMARS[language]
+
+def get_languages():
+    """
+    Returns:
+        (list[str]) : languages having a grammar file
+    """
+
+    return sorted(
+        os.path.splitext(file_name)[0] for file_name in os.listdir(GRAMMARS_ROOT)
+        if file_name.endswith('.json')
+    )
+
+def load_grammar(language):
+    """
+    Args:
+        language (str)
+
+    Returns:
+        (dict or None)
+
+    Read <language>'s compiled grammar from the disk cache, or compile it (and
+    cache it) if its grammar file changed since last compilation.
+    """
+
+    grammar_file = os.path.join(GRAMMARS_ROOT, '{}.json'.format(language))
+    if not os.path.isfile(grammar_file):
+        return None
+
+    with open(grammar_file, 'r') as opened_file:
+        content = opened_file.read()
+
+    grammar = json.loads(content)
+    cache_file = os.path.join(
+        kk.GRAMMAR_CACHE_DIR,
+        '{}_{}.json'.format(language, get_content_hash(content, grammar))
+    )
+
+    if os.path.isfile(cache_file):
+        try:
+            with open(cache_file, 'r') as opened_file:
+                return json.load(opened_file)
+        except (IOError, OSError, ValueError):
+            # unreadable, compiled again
+            pass
+
+    compiled = compile_grammar(grammar)
+
+    try:
+        if not os.path.isdir(kk.GRAMMAR_CACHE_DIR):
+            os.makedirs(kk.GRAMMAR_CACHE_DIR)
+
+        # (written aside first, so no other Maya session reads a partial file)
+        temp_file = '{}.{}.tmp'.format(cache_file, os.getpid())
+        with open(temp_file, 'w') as opened_file:
+            json.dump(compiled, opened_file)
+        os.rename(temp_file, cache_file)
+
+    except (IOError, OSError):
+        # no writable cache folder, compiled again next time
+        pass
+
+    return compiled
+
+def get_content_hash(content, grammar):
+    """
+    Args:
+        content (str) : grammar file content
+        grammar (dict) : parsed <content>
+
+    Returns:
+        (str)
+
+    Hash <content> along with the constants lists it uses, and the compiler
+    version.
+    """
+
+    names = sorted(set(
+        entry[key]
+        for table in RULES_TABLES for entry in grammar.get(table, ())
+        for key in ('patterns', 'words') if is_constant_name(entry.get(key))
+    ))
+
+    data = json.dumps(
+        [COMPILER_VERSION, content, [(name, getattr(kk, name)) for name in names]],
+        sort_keys=True
+    )
+
+    return hashlib.sha1(data.encode('utf-8')).hexdigest()
+
+def is_constant_name(value):
+    """
+    Args:
+        value (object)
+
+    Returns:
+        (bool) : whether <value> names a list from constants
+    """
+
+    try:
+        return isinstance(getattr(kk, value), list)
+    except (TypeError, AttributeError):
+        return False
+
+def compile_grammar(grammar):
+    """
+    Args:
+        grammar (dict) : parsed grammar file
+
+    Returns:
+        (dict)
+
+    Get <grammar> as rules tables of {'pattern', 'group', 'style'} and
+    {'words', 'style'} entries, with constants names resolved and literal
+    rules merged (see merge_literals).
+    """
+
+    compiled = {'delimiters': dict(
+        (key, grammar.get('delimiters', {}).get(key, [])) for key in DELIMITERS
+    )}
+
+    for table in RULES_TABLES:
+        rules = []
+
+        for entry in grammar.get(table, ()):
+            style = entry['style']
+            group = entry.get('group', 0)
+
+            if 'words' in entry:
+                words = entry['words']
+                if is_constant_name(words):
+                    words = getattr(kk, words)
+                rules.append({'words': list(words), 'style': style})
+                continue
+
+            patterns = entry.get('patterns', [entry.get('pattern')])
+            if is_constant_name(patterns):
+                patterns = getattr(kk, patterns)
+
+            for pattern in patterns:
+                rule = {'pattern': pattern, 'group': group, 'style': style}
+                if entry.get('requires'):
+                    rule['requires'] = entry['requires']
+                rules.append(rule)
+
+        compiled[table] = merge_literals(rules)
+
+    return compiled
+
+def merge_literals(rules):
+    """
+    Args:
+        rules (list[dict])
+
+    Returns:
+        (list[dict])
+
+    Merge runs of consecutive literal rules sharing the same style (like
+    operators) : single characters become one character class, and longer
+    literals only made of these characters are dropped, as already painted by
+    it. Other literals are kept as is, so painted characters do not change.
+    """
+
+    result = []
+    run = []
+
+    for rule in rules + [None]:
+        literal = None
+        if rule and 'pattern' in rule and not 'requires' in rule:
+            literal = get_literal(rule['pattern'])
+
+        if (
+            run and literal and not rule['group']
+            and rule['style'] == run[0][0]['style']
+        ):
+            run.append((rule, literal))
+            continue
+
+        if run:
+            result.extend(merge_run(run))
+            run = []
+
+        if rule is None:
+            break
+
+        if literal and not rule['group']:
+            run.append((rule, literal))
+        else:
+            result.append(rule)
+
+    return result
+
+def merge_run(run):
+    """
+    Args:
+        run (list[tuple(dict, str)]) : consecutive literal rules of the same
+                                       style, with their literal
+
+    Returns:
+        (list[dict])
+    """
+
+    if len(run) == 1:
+        return [run[0][0]]
+
+    chars = []
+    for _, literal in run:
+        if len(literal) == 1 and not literal in chars:
+            chars.append(literal)
+
+    rules = []
+    if chars:
+        rules.append({
+            'pattern': '[{}]'.format(''.join(re.escape(c) for c in chars)),
+            'group': 0,
+            'style': run[0][0]['style']
+        })
+
+    for rule, literal in run:
+        if not all(c in chars for c in literal):
+            rules.append(rule)
+
+    return rules
+
+def get_literal(pattern):
+    """
+    Args:
+        pattern (str)
+
+    Returns:
+        (str or None) : the text <pattern> matches, if it only matches this
+                        text (like '\+=')
+    """
+
+    literal = []
+    escaped = False
+
+    for char in pattern:
+        if escaped:
+            # (escaped letters and digits are classes, like \d)
+            if char.isalnum() or char == '_':
+                return None
+            literal.append(char)
+            escaped = False
+
+        elif char == '\\':
+            escaped = True
+
+        elif char in REGEX_SPECIALS:
+            return None
+
+        else:
+            literal.append(char)
+
+    if escaped or not literal:
+        return None
+
+    return ''.join(literal)
@@ -0,0 +1,1609 @@
+"""
+Qt-free highlighting rules for Python, MEL and Maya's log panel. Rules get a
+line and the previous line's state, and return the line's spans of style keys
+and state (see Rule.highlight), so they can also be run out of any
+QSyntaxHighlighter (worker threads, saved logs, benchmarks).
+"""
+
+import re
+import time
+import bisect
+import weakref
+import threading
+import collections
+
+from custom_script_editor import constants as kk
+from custom_script_editor import regex_backend
+from custom_script_editor import grammar
+
+
+
+# compiled delimiters scanners, for each rule class (see compile_delimiters)
+DELIM_CACHE = {}
+# rule tables shared by rules of the same class (see Rule.set_tables)
+RULE_TABLES = weakref.WeakValueDictionary()
+# rule classes of languages having a grammar file only (see get_rule_class)
+RULE_CLASSES = {}
+# patterns disabled for running too long on a single line (see guard_pattern)
+RUNAWAY_PATTERNS = set()
+# warnings about disabled patterns, not printed from within a highlight (the
+# log panel may be the highlighted document), but by WARNINGS_SCHEDULER if any
+# (see syntax_highlight.schedule_warnings)
+PENDING_WARNINGS = []
+WARNINGS_SCHEDULER = None
+# backslashes runs and non-whitespace runs (see Rule.set_line_masks)
+BACKSLASHES_REGEX = re.compile('\\\\+')
+SOLID_REGEX = re.compile('\S+', re.UNICODE)
+# words, as matched by '\bword\b' patterns (see WordSet)
+WORD_REGEX = re.compile('\w+', re.UNICODE)
+
+# Python tokens, for PythonTokenRule (one named group per token kind)
+PYTHON_TOKEN_REGEX = re.compile(
+    '|'.join([
+        '(?P<space>\s+)',
+        '(?P<comment>#.*)',
+        '(?P<string>[rRbBuUfF]{0,2}(?P<quote>\'\'\'|"""|\'|"))',
+        '(?P<number>0[xXoObB][0-9a-fA-F_]+[lL]?|'
+        '(\d[\d_]*(\.[\d_]*)?|\.\d[\d_]*)([eE][+-]?\d+)?[jJlL]?)',
+        '(?P<name>[^\W\d]\w*)',
+        '(?P<decorator>@\w+)',
+        '(?P<operator>[=!<>+\-*/%^|&~@]+)',
+        '(?P<other>.)'
+    ]),
+    re.UNICODE
+)
+# closing quote or escaped character, for each string delimiter
+QUOTE_REGEXES = dict((q, re.compile('\\\\|' +q)) for q in ("'''", '"""', "'", '"'))
+# next two non-whitespace characters
+NEXT_CHARS_REGEX = re.compile('\s*(\S?)\s*(\S?)')
+# log panel's traceback lines (see LogRule.traceback_applied)
+TRACEBACK_PATTERN = '^(#\s)*Traceback'
+# traceback lines following a TRACEBACK_PATTERN line
+TRACEBACK_LINE_PATTERN = '^(#\s)*\s+'
+# log panel block states : MEL/Python sub-rule state on the lower bits, then
+# the language mode and the traceback flag (see LogRule.encode_state)
+LOG_MODES = ('log', 'MEL', 'Python')
+LOG_MODE_SHIFT = 8
+LOG_SUB_STATE_MASK = (1 << LOG_MODE_SHIFT) -1
+LOG_MODE_MASK = 3 << LOG_MODE_SHIFT
+LOG_TRACEBACK_FLAG = 1 << (LOG_MODE_SHIFT +2)
+
+
+class RuleProfile(object):
+    """
+    Opt-in statistics of Rule.apply and LogRule.apply : calls, matches and
+    cumulative time, for each (language, rule kind, pattern). Rules only
+    record into it while enabled (see PROFILE, and the Custom Menu's
+    'Highlighter profile').
+    """
+
+    def __init__(self, enabled=False):
+        """
+        Args:
+            enabled (bool, optional)
+        """
+
+        self.enabled = enabled
+        self.stats = {}
+        # (rules may record from worker threads, see highlight_scheduler)
+        self.lock = threading.Lock()
+
+    def add(self, key, matches, start_time):
+        """
+        Args:
+            key (tuple) : language, rule kind ('rule', 'multiline', 'message',
+                          'blocking', 'traceback' or 'detector') and pattern
+                          (regex_backend.Regex, WordSet or str)
+            matches (int)
+            start_time (float) : time.time() before the rule was applied
+        """
+
+        spent = time.time() -start_time
+
+        with self.lock:
+            stat = self.stats.get(key)
+            if stat is None:
+                stat = self.stats[key] = [0, 0, 0.0]
+
+            stat[0] += 1
+            stat[1] += matches
+            stat[2] += spent
+
+    def clear(self):
+        with self.lock:
+            self.stats.clear()
+
+    def get_report(self, count=30):
+        """
+        Args:
+            count (int, optional) : number of patterns to report
+
+        Returns:
+            (list[str]) : slowest patterns first, with their statistics
+        """
+
+        # (snapshot, as rules may still be recording)
+        with self.lock:
+            stats = [(key, tuple(stat)) for key, stat in self.stats.items()]
+
+        total_time = sum(stat[2] for key, stat in stats)
+        lines = ['{:.1f} ms in {} patterns'.format(total_time *1000, len(stats))]
+
+        ranked = sorted(stats, key=lambda item: -item[1][2])
+        for (language, kind, pattern), (calls, matches, spent) in ranked[:count]:
+            lines.append(
+                '{:>9.1f} ms {:>8} calls {:>8} matches   {}/{} : {}'.format(
+                    spent *1000,
+                    calls,
+                    matches,
+                    language,
+                    kind,
+                    get_pattern_name(pattern)
+                )
+            )
+
+        return lines
+
+
+# per-pattern statistics, recorded while enabled
+PROFILE = RuleProfile(kk.HIGHLIGHT_PROFILE)
+
+
+class WordSet(frozenset):
+    """
+    Set of whole words (keywords, builtins...etc) sharing the same style. Used
+    in rule tables in place of a pattern : lines are split into words once, and
+    each word is looked-up in the set, whatever the set's size.
+    """
+
+    def __new__(cls, words):
+        """
+        Args:
+            words (list[str]) : multiple words entries (like 'else if') are split
+        """
+
+        return frozenset.__new__(cls, (w for entry in words for w in entry.split()))
+
+
+class LineFormats(object):
+    """
+    Style keys and state buffer for the line being highlighted. Rules paint
+    into it with set_format (same behavior as QSyntaxHighlighter.setFormat,
+    latest calls overriding previous ones), then get_spans merges runs of
+    identical keys. States are handled as QSyntaxHighlighter's block states.
+    """
+
+    def __init__(self):
+        self.formats = []
+        self.previous_state = -1
+        self.state = -1
+        # rules skipped for lack of time (see Rule.apply)
+        self.truncated = False
+
+    def reset(self, length, previous_state=-1):
+        """
+        Args:
+            length (int) : line's length
+            previous_state (int, optional) : previous line's state
+
+        Clear buffer for a new line.
+        """
+
+        self.formats = [None] *length
+        self.previous_state = previous_state
+        self.state = -1
+        self.truncated = False
+
+    def get_previous_state(self):
+        return self.previous_state
+
+    def get_state(self):
+        return self.state
+
+    def set_state(self, state):
+        self.state = state
+
+    def set_format(self, start, count, style):
+        """
+        Args:
+            start (int)
+            count (int)
+            style (tuple) : style key (see Rule.get_styles)
+
+        Set <style> on <count> characters from <start>.
+        """
+
+        if start < 0 or start >= len(self.formats) or count <= 0:
+            return
+
+        end = min(start +count, len(self.formats))
+        self.formats[start:end] = [style] *(end -start)
+
+    def get_spans(self):
+        """
+        Returns:
+            (list[tuple(int, int, tuple)]) : start, length and style key of each
+                                             run of identical style keys
+        """
+
+        formats = self.formats
+        spans = []
+        start = 0
+
+        for i in range(1, len(formats) +1):
+            if i < len(formats) and formats[i] is formats[start]:
+                continue
+
+            if formats[start] is not None:
+                spans.append((start, i -start, formats[start]))
+            start = i
+
+        return spans
+
+
+class StyleKeys(dict):
+    """
+    {'pattern_name': (language, 'pattern_name')} dict of the style keys rules
+    paint with, instead of formats, so highlight results do not depend on any
+    palette. Keys are created on first request.
+    """
+
+    def __init__(self, language):
+        """
+        Args:
+            language (str)
+        """
+
+        dict.__init__(self)
+        self.language = language
+
+    def __missing__(self, attr):
+        self[attr] = (self.language, attr)
+        return self[attr]
+
+
+class RuleTables(dict):
+    """
+    {attribute name: table} dict of compiled rule tables and style keys,
+    shared by every rule of the same class and regex backend (see
+    Rule.set_tables). Entries are dropped from RULE_TABLES as soon as no rule
+    uses them anymore.
+    """
+
+
+class MessageClassifier(object):
+    """
+    Log message rules (see LogRule.get_message_rules) compiled as a single
+    anchored alternation, in rules order, so each line is classified with one
+    search instead of one search per rule. The first matching rule wins, as
+    alternatives are tried in order from the line's start.
+    """
+
+    def __init__(self, rules, backend=None):
+        """
+        Args:
+            rules (list[tuple(str, tuple)]) : patterns and style keys
+            backend (str, optional) : regex backend name
+        """
+
+        self.styles = []
+        # index of the group wrapping each rule's pattern
+        self.groups = []
+
+        alternatives = []
+        group = 1
+        for pattern, style in rules:
+            alternatives.append('({})'.format(pattern))
+            self.styles.append(style)
+            self.groups.append(group)
+            group += re.compile(pattern).groups +1
+
+        self.regex = None
+        if alternatives:
+            self.regex = regex_backend.get_regex(
+                '^(?:{})'.format('|'.join(alternatives)),
+                backend
+            )
+
+    def classify(self, line):
+        """
+        Args:
+            line (str) : lowered line (message rules are case-insensitive)
+
+        Returns:
+            (tuple or None) : style key of the first rule matching <line>
+        """
+
+        if self.regex is None:
+            return None
+
+        match = self.regex.search(line)
+        if not match:
+            return None
+
+        for group, style in zip(self.groups, self.styles):
+            if match.start(group) > -1:
+                return style
+
+
+class Rule(object):
+    """
+    Base class for highlighting rules. Must be re-implemented.
+
+    Rules paint style keys and block states into their LineFormats buffer (see
+    highlight), with no need for Qt.
+    """
+
+    # palette type of the rule's styles ('python', 'mel' or 'log')
+    language = None
+    # grammar file of the rule's rules and delimiters (see grammar module)
+    grammar = None
+
+    docstr_chars = []
+    docstr_close_chars = []
+    cmnt_chars = []
+    str_chars = []
+
+    def __init__(self, line_formats=None):
+        """
+        Args:
+            line_formats (LineFormats, optional) : to share with another rule
+        """
+
+        self.line_formats = line_formats or LineFormats()
+        self.regex_backend = regex_backend.get_backend(self.language)
+        self.set_tables()
+
+        if self.grammar:
+            delimiters = grammar.get_grammar(self.grammar)['delimiters']
+            self.docstr_chars = delimiters['docstrings']
+            self.docstr_close_chars = delimiters['docstrings_close']
+            self.str_chars = delimiters['strings']
+            self.cmnt_chars = delimiters['comments']
+
+        self.delim_strings = self.docstr_chars +self.str_chars +self.cmnt_chars
+        self.docstr_states = [i for i, _ in enumerate(self.docstr_chars)]
+        self.str_states = [i +len(self.docstr_chars) for i, _ in enumerate(self.str_chars)]
+        self.comment_states = [
+            i +len(self.docstr_chars) +len(self.str_chars) for i, _ in enumerate(self.cmnt_chars)
+        ]
+
+        # opening delimiters scanner and closing delimiters (for each state)
+        self.delim_regex, self.close_regexes = compile_delimiters(
+            self.delim_strings,
+            self.docstr_close_chars,
+            self.regex_backend
+        )
+
+        self.map_methods()
+
+    def highlight(self, line, previous_state=-1):
+        """
+        Args:
+            line (str)
+            previous_state (int, optional) : previous line's state
+
+        Returns:
+            (tuple(list[tuple(int, int, tuple)], int)) : line's style keys spans
+                                                          (see
+                                                          LineFormats.get_spans)
+                                                          and state
+        """
+
+        self.line_formats.reset(len(line), previous_state)
+        self.apply(line)
+
+        return self.line_formats.get_spans(), self.line_formats.state
+
+    def resolve_state(self, line, previous_state=-1):
+        """
+        Args:
+            line (str)
+            previous_state (int, optional) : previous line's state
+
+        Returns:
+            (int) : line's state, resolved with no spans (see apply_state)
+        """
+
+        self.line_formats.reset(len(line), previous_state)
+        self.apply_state(line)
+
+        return self.line_formats.state
+
+    def is_truncated(self):
+        """
+        Returns:
+            (bool) : whether the last highlighted line skipped some rules for
+                     lack of time (its spans are not to be cached, as they
+                     depend on how busy the process was)
+        """
+
+        return self.line_formats.truncated
+
+    def set_tables(self):
+        """
+        Set rule tables as attributes, shared with every other rule having the
+        same tables key (built if there is none).
+        """
+
+        key = self.get_tables_key()
+
+        tables = RULE_TABLES.get(key)
+        if tables is None:
+            tables = self.build_tables()
+            RULE_TABLES[key] = tables
+
+        # keep a reference for tables to stay registered
+        self.tables = tables
+        for name, table in tables.items():
+            setattr(self, name, table)
+
+    def get_tables_key(self):
+        """
+        Returns:
+            (tuple) : rule class and regex backend
+        """
+
+        return (self.__class__.__name__, self.regex_backend)
+
+    def build_tables(self):
+        """
+        Returns:
+            (RuleTables)
+
+        Compile rule tables.
+        """
+
+        self.styles = StyleKeys(self.language)
+
+        return RuleTables(
+            styles=self.styles,
+            rules=self.compile_rules(self.get_rules())
+        )
+
+    def compile_rules(self, rules):
+        """
+        Args:
+            rules (list[tuple(str, int, tuple)])
+
+        Returns:
+            (list[tuple(regex_backend.Regex, int, tuple)])
+
+        Get <rules> with compiled expressions, so patterns are not parsed again
+        on each highlighted line.
+        """
+
+        return [
+            (
+                pattern if isinstance(pattern, (WordSet, regex_backend.Regex))
+                else self.get_regex(pattern),
+                nth,
+                fmt
+            )
+            for (pattern, nth, fmt) in rules
+        ]
+
+    def get_regex(self, pattern, required=None):
+        """
+        Args:
+            pattern (str)
+            required (str, optional) : literal every match contains (see
+                                       regex_backend.PrefilteredRegex)
+
+        Returns:
+            (regex_backend.Regex)
+
+        Get <pattern> compiled with the rule's regex backend.
+        """
+
+        return regex_backend.get_regex(pattern, self.regex_backend, required)
+
+    def apply_rule(self, line, expression, nth, txt_format):
+        """
+        Args:
+            line (str)
+            expression (regex_backend.Regex)
+            nth (int) : the nth matching group that is to be highlighted
+            txt_format (tuple) : style key
+
+        Returns:
+            (int) : matches count
+
+        Apply <txt_format> on segments that matches <expression> in <line>.
+
+        """
+
+        spans = expression.spans(line, nth)
+        for start, length in spans:
+            self.setFormat(start, length, txt_format)
+
+        return len(spans)
+
+    def apply_words(self, words, word_set, txt_format):
+        """
+        Args:
+            words (list[tuple(int, str)]) : line's words and their positions
+            word_set (WordSet)
+            txt_format (tuple) : style key
+
+        Returns:
+            (int) : matches count
+
+        Apply <txt_format> on every word from <words> that is in <word_set>.
+        """
+
+        matches = 0
+        for index, word in words:
+            if word in word_set:
+                self.setFormat(index, len(word), txt_format)
+                matches += 1
+
+        return matches
+
+    def apply(self, line):
+        """
+        Args:
+            line (str)
+
+        Apply all defined rules on line.
+        """
+
+        # line's words, split on first WordSet rule only
+        words = None
+
+        rules_line = self.get_rules_line(line)
+        deadline = time.time() +kk.LINE_TIME_BUDGET *0.001
+        profile = PROFILE if PROFILE.enabled else None
+
+        # straight-forward regex rules, no block state used
+        for pattern, nth, txt_format in self.rules:
+            # out of time, skip remaining rules
+            start_time = time.time()
+            if start_time > deadline:
+                self.line_formats.truncated = True
+                break
+
+            if pattern in RUNAWAY_PATTERNS:
+                continue
+
+            if isinstance(pattern, WordSet):
+                if words is None:
+                    words = split_words(rules_line)
+                matches = self.apply_words(words, pattern, txt_format)
+            else:
+                matches = self.apply_rule(rules_line, pattern, nth, txt_format)
+
+            if profile:
+                profile.add((self.language, 'rule', pattern), matches, start_time)
+            guard_pattern(pattern, start_time, self.language)
+
+        # strings, docstrings and comments rules, using block states to propagate
+        # un-closed rules from one line to another
+        start_time = time.time()
+        self.apply_multiline_style(line)
+
+        if profile:
+            profile.add(
+                (self.language, 'multiline', self.delim_regex),
+                self.delim_matches,
+                start_time
+            )
+
+    def get_rules(self):
+        """
+        Returns:
+            (list[tuple(str or WordSet, int, tuple)])
+
+        Get the grammar file's rules (none by default), except for comments,
+        strings and triple-quotes, that are handled differently.
+        """
+
+        return self.get_grammar_rules('rules')
+
+    def get_grammar_rules(self, table):
+        """
+        Args:
+            table (str) : 'rules', 'message_rules' or 'blocking_rules'
+
+        Returns:
+            (list[tuple(str or WordSet, int, tuple)])
+
+        Get <table> from the rule's grammar file, with patterns (or word sets),
+        matching group and style key. Patterns with a required literal are
+        compiled already.
+        """
+
+        if not self.grammar:
+            return []
+
+        rules = []
+        for entry in grammar.get_grammar(self.grammar)[table]:
+            if 'words' in entry:
+                pattern = WordSet(entry['words'])
+            elif entry.get('requires'):
+                pattern = self.get_regex(entry['pattern'], entry['requires'])
+            else:
+                pattern = entry['pattern']
+
+            rules.append((pattern, entry.get('group', 0), self.styles[entry['style']]))
+
+        return rules
+
+    def get_rules_line(self, line):
+        """
+        Args:
+            line (str)
+
+        Returns:
+            (str)
+
+        Get the part of <line> regex rules are applied on : the whole line, or
+        only its start for lines longer than kk.LONG_LINE_THRESHOLD (strings,
+        docstrings and comments are still applied on the whole line, as they
+        set the block state).
+        """
+
+        if len(line) > kk.LONG_LINE_THRESHOLD:
+            return line[:kk.LONG_LINE_PREFIX]
+        return line
+
+    def apply_state(self, line):
+        """
+        Args:
+            line (str)
+
+        Only resolve line's block state (formats are not applied, see
+        highlight_scheduler.LazyHighlight). Strings, docstrings and comments
+        rules are the only ones using block states.
+        """
+
+        self.apply_multiline_style(line)
+
+    def apply_multiline_style(self, line):
+        """
+        Args:
+            line (str)
+
+        Apply strings, docstrings and comments highlight on line.
+        """
+
+        self.set_line_masks(line)
+
+        # propagate previous line's state
+        self.setCurrentBlockState(self.previousBlockState())
+
+        start = 0
+        pos = 0
+        # opened delimiters count (see RuleProfile)
+        self.delim_matches = 0
+
+        while len(line) > pos > -1:
+            # get current delimiter
+            state = self.currentBlockState()
+            delim_str = self.delim_strings[state] if state > -1 else None
+
+            # switch to docstring closing char
+            if self.currentBlockState() in self.docstr_states:
+                delim_idx = self.docstr_chars.index(delim_str)
+                delim_str = self.docstr_close_chars[delim_idx]
+
+                        ############################
+                        #   No state is going on   #
+                        ############################
+
+            # if no current delimiter, get the next delimiter in line
+            if delim_str is None:
+                match = self.delim_regex.search(line, pos) if self.delim_regex else None
+
+                # no more delimiter in line
+                if not match:
+                    break
+
+                pos = match.start()
+
+                # if found delimiter is escaped, search again
+                if self.is_escaped(line, pos):
+                    pos +=1
+                    continue
+
+                # "open" current state and delimiter (matched group's index)
+                state = match.lastindex -1
+                self.delim_matches += 1
+                self.setCurrentBlockState(state)
+                delim_str = self.delim_strings[state]
+
+                if state in self.comment_states:      # comments, paint until the end of the line
+                    self.setFormat(pos, len(line) -pos, self.styles['comments'])
+                    self.setCurrentBlockState(-1)
+                    return          # there's no need for further analysis in this line
+
+                # "open" str (set painting start position)
+                start = pos
+                pos += len(delim_str.replace('\\', ''))
+
+
+                    ######################################
+                    #   Some state is already going on   #
+                    ######################################
+
+            # else, search for the next occurence of the current delimiter in line
+            else:
+                match = self.close_regexes[state].search(line, pos)
+                next_pos = match.start() if match else -1
+
+                # not found
+                if next_pos == -1:
+                    # check for comments after a \-propagated string
+                    comment_pos = line.find('#', pos)
+                    # comments found
+                    if comment_pos and self.currentBlockState() in self.str_states:
+                        # last character before was a non-escaped \
+                        if self.last_util_char(line, comment_pos) == '\\':
+                            self.paint_string(start, comment_pos-1 -start, line)
+                            self.setFormat(
+                                comment_pos,
+                                len(line) -comment_pos,
+                                self.styles['comments']
+                            )
+                            return
+                    break
+
+                # closing char is escaped
+                if self.is_escaped(line, next_pos):
+                    self.paint_string(start, next_pos -start, line)
+                    pos = next_pos +1
+                    continue
+
+                # "close" and paint string
+                self.paint_string(start, next_pos +len(delim_str.replace('\\', '')) -start -1, line)
+                self.setCurrentBlockState(-1)
+                pos = next_pos +len(delim_str.replace('\\', ''))
+
+        ##############################################################
+        #   after iterations (current state may still be "opened")   #
+        ##############################################################
+
+        if self.currentBlockState() == -1:
+            return
+
+        # comments (those after \ string-propagation are handled higher)
+        if self.currentBlockState() in self.comment_states:
+            self.setFormat(start, len(line) -start -1, self.styles['comments'])
+            self.setCurrentBlockState(-1)
+
+        elif self.currentBlockState() in self.str_states:
+            # no string-propagation
+            if line[-1] != '\\':
+                self.setCurrentBlockState(-1)
+            else:
+                self.paint_string(start, len(line) -start -1, line)
+                self.setFormat(len(line)-1, 1, self.styles['special'])
+        # triple-quotes
+        else:
+            self.paint_string(start, len(line) -start -1, line)
+
+    def set_line_masks(self, line):
+        """
+        Args:
+            line (str)
+
+        Compute <line>'s escaped characters and non-whitespace runs once, to be
+        shared by is_escaped, last_util_char and paint_string.
+        """
+
+        # positions of characters preceded by an odd number of \
+        self.escapes = []
+        for match in BACKSLASHES_REGEX.finditer(line):
+            self.escapes.extend(range(match.start() +1, match.end() +1, 2))
+        self.escaped = set(self.escapes)
+
+        # (start, end) of non-whitespace characters runs
+        self.solid_runs = [match.span() for match in SOLID_REGEX.finditer(line)]
+        self.solid_starts = [start for start, _ in self.solid_runs]
+
+    def last_util_char(self, line, pos):
+        """
+        Args:
+            line (str)
+            pos (int)
+
+        Returns:
+            (str or None)
+
+        Perform backward-lookup from <pos> in line for the first non-whitespace
+        character.
+        Return None if this character is escaped.
+        """
+
+        # (negative <pos> counts from the end, as in line[:pos])
+        if pos < 0:
+            pos = max(len(line) +pos, 0)
+
+        # last non-whitespace run starting before pos
+        run_index = bisect.bisect_left(self.solid_starts, pos) -1
+        if run_index < 0:
+            return
+
+        index = min(self.solid_runs[run_index][1], pos) -1
+        # return None if char is escaped
+        if self.is_escaped(line, index):
+            return
+
+        return line[index]
+
+    def is_escaped(self, line, pos):
+        """
+        Args:
+            line (str)
+            pos (int)
+
+        Returns:
+            (bool)
+
+        Check the escaped state of the character at <pos> in <line> (from the
+        masks computed by set_line_masks).
+        """
+
+        return pos in self.escaped
+
+    def paint_string(self, start, count, line):
+        """
+        Args:
+            start (int) : string start pos in <line>
+            count (int) : number of character to paint
+            line (str)
+
+        Returns:
+            None
+
+        Set each charcater's style from start to end, checking if it is escaped
+        or not.
+        """
+
+        end = min(start +count +1, len(line))
+
+        # skip whitespaces, as they don't need to be painted, and must be
+        # considered as escaped characters for "special" style painting.
+        run_index = max(bisect.bisect_right(self.solid_starts, start) -1, 0)
+        while run_index < len(self.solid_runs):
+            run_start, run_end = self.solid_runs[run_index]
+            if run_start >= end:
+                break
+
+            run_start = max(run_start, start)
+            run_end = min(run_end, end)
+            if run_start < run_end:
+                self.setFormat(run_start, run_end -run_start, self.styles['string'])
+            run_index += 1
+
+        first = bisect.bisect_left(self.escapes, start)
+        last = bisect.bisect_left(self.escapes, end)
+
+        for i in self.escapes[first:last]:
+            if not line[i].isspace():
+                self.setFormat(i-1, 2, self.styles['special'])
+
+    def map_methods(self):
+        """ Simplify methods acces by creating aliases. """
+
+        self.setFormat = self.line_formats.set_format
+        self.setCurrentBlockState = self.line_formats.set_state
+        self.currentBlockState = self.line_formats.get_state
+        self.previousBlockState = self.line_formats.get_previous_state
+
+
+
+class LogRule(Rule):
+    """
+    Syntax highlighter for Maya Script Editor's log panel. This class has its
+    own specific rules, and also uses MEL and Python ones.
+    """
+
+    language = 'log'
+    grammar = 'log'
+
+    def __init__(self):
+        Rule.__init__(self)
+
+        # (sub-rules share the line's buffer and states)
+        self.mel_rules = MelRule(self.line_formats)
+        self.python_rules = PythonRule(self.line_formats)
+
+        # language mode and traceback flag of the line being highlighted,
+        # restored from the previous block state (see decode_state)
+        self.current_rule = 'log'
+        self.in_traceback = False
+
+    def build_tables(self):
+        """
+        Returns:
+            (RuleTables)
+
+        Compile rule tables, blocking and message rules included.
+        """
+
+        tables = Rule.build_tables(self)
+        tables['blocking_rules'] = self.compile_rules(self.get_blocking_rules())
+        tables['message_classifier'] = MessageClassifier(
+            self.get_message_rules(),
+            self.regex_backend
+        )
+        tables['traceback_regex'] = self.get_regex(TRACEBACK_PATTERN)
+        tables['traceback_line_regex'] = self.get_regex(TRACEBACK_LINE_PATTERN)
+
+        return tables
+
+    def highlight(self, line, previous_state=-1):
+        spans, state = Rule.highlight(self, line, self.decode_state(previous_state))
+        return spans, self.encode_state(state)
+
+    def resolve_state(self, line, previous_state=-1):
+        state = Rule.resolve_state(self, line, self.decode_state(previous_state))
+        return self.encode_state(state)
+
+    def decode_state(self, state):
+        """
+        Args:
+            state (int) : log panel block state (see encode_state)
+
+        Returns:
+            (int) : MEL/Python sub-rule state
+
+        Restore the language mode and traceback flag stored in <state>, so each
+        line only depends on the previous block (as Qt expects when it only
+        highlights edited blocks and the following ones whose state changed).
+        """
+
+        if state < 0:
+            state = 0
+
+        self.current_rule = LOG_MODES[(state & LOG_MODE_MASK) >> LOG_MODE_SHIFT]
+        self.in_traceback = bool(state & LOG_TRACEBACK_FLAG)
+
+        return (state & LOG_SUB_STATE_MASK) -1
+
+    def encode_state(self, state):
+        """
+        Args:
+            state (int) : MEL/Python sub-rule state
+
+        Returns:
+            (int) : log panel block state, with the current language mode and
+                    traceback flag
+        """
+
+        state = (state +1) | (LOG_MODES.index(self.current_rule) << LOG_MODE_SHIFT)
+        if self.in_traceback:
+            state |= LOG_TRACEBACK_FLAG
+
+        return state
+
+    def get_blocking_rules(self):
+        """
+        Returns:
+            (list[tuple(str, int, tuple)])
+
+        These rules are applied prior to MEL and Python rules. If any rule was
+        used, all MEL, Python and self rules will be ignored.
+        """
+
+        return self.get_grammar_rules('blocking_rules')
+
+    def get_message_rules(self):
+        """
+        Returns:
+            (list[tuple(str, tuple)])
+
+        Get all message rules. These are applied on the whole line, analysing the
+        line with no case match.
+        """
+
+        return [
+            (pattern, txt_format)
+            for pattern, _, txt_format in self.get_grammar_rules('message_rules')
+        ]
+
+    def apply(self, line):
+        """
+        Args:
+            line (str)
+
+        Apply syntax highlighting rules to the given line.
+        """
+
+        profile = PROFILE if PROFILE.enabled else None
+
+        try:
+            start_time = time.time()
+            applied = self.traceback_applied(line)
+
+            if profile:
+                profile.add(('log', 'traceback', TRACEBACK_PATTERN), int(applied), start_time)
+            if applied:
+                return
+
+            # apply message rules, and skip next if some rule matches (as applied
+            # on the whole line)
+            classifier = self.message_classifier
+            if not classifier.regex in RUNAWAY_PATTERNS:
+                start_time = time.time()
+                txt_format = classifier.classify(line.lower())
+
+                if profile:
+                    profile.add(
+                        ('log', 'message', classifier.regex),
+                        int(txt_format is not None),
+                        start_time
+                    )
+                guard_pattern(classifier.regex, start_time, 'log')
+
+                if txt_format is not None:
+                    self.setFormat(0, len(line), txt_format)
+                    self.current_rule = 'log'
+                    return
+
+            # (only the start of long lines is analysed from here)
+            rules_line = self.get_rules_line(line)
+
+            block_next = False
+            # apply blocking rules
+            for pattern, nth, txt_format in self.blocking_rules:
+                if pattern in RUNAWAY_PATTERNS:
+                    continue
+
+                start_time = time.time()
+                match = pattern.search(rules_line)
+
+                if profile:
+                    profile.add(('log', 'blocking', pattern), int(bool(match)), start_time)
+                guard_pattern(pattern, start_time, 'log')
+
+                if match:
+                    start = match.start(nth)
+                    end = match.end(nth)
+                    self.setFormat(start, end -start, txt_format)
+                    block_next = True
+
+            if block_next:
+                return
+
+            start_time = time.time()
+            mel_line = is_mel_line(rules_line)
+
+            if profile:
+                profile.add(('log', 'detector', 'is_mel_line'), int(mel_line), start_time)
+
+            if mel_line:
+                if not self.current_rule in ('log', 'MEL'):
+                    # interrupt potential opened docstrings
+                    self.setCurrentBlockState(-1)
+                self.current_rule = 'MEL'
+
+            else:
+                start_time = time.time()
+                python_line = is_python_line(rules_line)
+
+                if profile:
+                    profile.add(('log', 'detector', 'is_python_line'), int(python_line), start_time)
+
+                if python_line:
+                    if not self.current_rule in ('log', 'Python'):
+                        # interrupt potential opened docstrings
+                        self.setCurrentBlockState(-1)
+                    self.current_rule = 'Python'
+
+            if self.current_rule == 'MEL':
+                self.mel_rules.apply(line)
+            elif self.current_rule == 'Python':
+                self.python_rules.apply(line)
+
+            # apply overall rules
+            for pattern, nth, txt_format in self.rules or ():
+                if pattern in RUNAWAY_PATTERNS:
+                    continue
+
+                start_time = time.time()
+                matches = self.apply_rule(rules_line, pattern, nth, txt_format)
+
+                if profile:
+                    profile.add(('log', 'rule', pattern), matches, start_time)
+                guard_pattern(pattern, start_time, 'log')
+
+        # silent errors so we don't fall into a print loop...
+        except:
+            pass
+
+    def apply_multiline_style(self, line):
+        return
+
+    def apply_state(self, line):
+        self.apply(line)
+
+    def traceback_applied(self, line):
+        """
+        Args:
+            line (str)
+
+        Returns:
+            (bool) : whether <line> is part of a traceback
+
+        Handle Tracebacks (flagged in block states, see encode_state).
+        """
+
+        # propagate previous line's state
+        self.setCurrentBlockState(self.previousBlockState())
+
+        if self.traceback_regex.search(line):
+            # (interrupts potential opened docstrings)
+            self.setCurrentBlockState(-1)
+            self.in_traceback = True
+            self.setFormat(0, len(line), self.styles['traceback'])
+            return True
+
+        if self.in_traceback:
+            if self.traceback_line_regex.search(line):
+                self.setFormat(0, len(line), self.styles['traceback'])
+                return True
+            else:
+                self.in_traceback = False
+                self.setCurrentBlockState(-1)
+
+        return False
+
+
+class MelRule(Rule):
+    """
+    Syntax highlighter for the MEL language.
+    """
+
+    language = 'mel'
+    grammar = 'mel'
+
+
+class PythonRule(Rule):
+    """
+    Syntax highlighter for the Python language.
+    """
+
+    language = 'python'
+    grammar = 'python'
+
+
+class PythonTokenRule(Rule):
+    """
+    Single-pass lexer for the Python language, used as an alternative engine
+    to PythonRule's regex rules (see PythonHighlighter.set_engine).
+
+    Each line is tokenized once, from left to right. Unclosed strings and
+    docstrings are propagated to the next line through the block state, as the
+    index of their (quote, raw) pair in <string_states>.
+    """
+
+    language = 'python'
+
+    # non-raw states match PythonRule's delimiters order
+    string_states = [(q, raw) for raw in (False, True) for q in ("'''", '"""', "'", '"')]
+
+    keywords = WordSet(kk.PYTHON_KEYWORDS)
+    builtins = WordSet(kk.PYTHON_BUILTINS)
+    numbers = WordSet(kk.PYTHON_NUMBERS)
+
+    def apply(self, line):
+        """
+        Args:
+            line (str)
+
+        Tokenize <line> and apply tokens styles.
+        """
+
+        state = self.previousBlockState()
+        self.setCurrentBlockState(-1)
+
+        pos = 0
+        # go on with the string opened on previous line
+        if 0 <= state < len(self.string_states):
+            quote, raw = self.string_states[state]
+            pos = self.paint_string_token(line, 0, 0, quote, raw)
+
+        prev = None             # previous token (whitespaces excluded)
+        class_depth = None      # parenthesis depth into "class Name(...)"
+
+        while -1 < pos < len(line):
+            match = PYTHON_TOKEN_REGEX.match(line, pos)
+            kind = match.lastgroup
+            token = match.group()
+            start, pos = match.start(), match.end()
+
+            if kind == 'space':
+                continue
+
+            if kind == 'comment':
+                self.setFormat(start, len(token), self.styles['comments'])
+                break
+
+            if kind == 'string':
+                quote = match.group('quote')
+                raw = 'r' in token[:-len(quote)].lower()
+                pos = self.paint_string_token(line, start, pos, quote, raw)
+
+            elif kind == 'number':
+                self.setFormat(start, len(token), self.styles['numbers'])
+
+            elif kind == 'decorator':
+                self.setFormat(start, len(token), self.styles['decorators'])
+
+            elif kind == 'operator':
+                self.setFormat(start, len(token), self.styles['operator'])
+
+            elif kind == 'name':
+                next_chars = NEXT_CHARS_REGEX.match(line, pos).groups()
+                style = self.name_style(token, prev, next_chars, class_depth)
+                if style:
+                    self.setFormat(start, len(token), self.styles[style])
+
+                if prev == 'class' and next_chars[0] == '(':
+                    class_depth = 0
+
+            elif class_depth is not None and token in '()':
+                class_depth += 1 if token == '(' else -1
+                if not class_depth:
+                    class_depth = None
+
+            prev = token
+
+    def apply_state(self, line):
+        # the state is resolved in the same pass as the formats
+        self.apply(line)
+
+    def name_style(self, name, prev, next_chars, class_depth):
+        """
+        Args:
+            name (str)
+            prev (str or None) : previous token
+            next_chars (tuple(str, str)) : next two non-whitespace characters
+            class_depth (int or None) : parenthesis depth into class declaration
+
+        Returns:
+            (str or None) : palette's style name
+
+        Get <name>'s style from its surrounding tokens.
+        """
+
+        if prev == 'def':
+            return 'def_name'
+        if prev == 'class':
+            return 'class_name'
+        if name in self.keywords:
+            return 'keyword'
+        if name in self.numbers:
+            return 'numbers'
+        if next_chars[0] == '(':
+            return 'called'
+        # kwarg=
+        if prev in ('(', ',') and next_chars[0] == '=' and next_chars[1] != '=':
+            return 'numbers'
+        if prev == '.':
+            return 'interm'
+        if class_depth:
+            return 'class_arg'
+        if name == 'self':
+            return 'self'
+        if name in self.builtins:
+            return 'special'
+
+    def paint_string_token(self, line, start, pos, quote, raw):
+        """
+        Args:
+            line (str)
+            start (int) : string start (prefix and opening quote included)
+            pos (int) : position to look for the closing <quote> from
+            quote (str)
+            raw (bool)
+
+        Returns:
+            (int) : position after the closing quote, -1 if not closed in line
+
+        Paint the string from <start> to its closing quote (or to the end of the
+        line), escaped characters being painted as "special" on non-raw strings.
+        Set the block state if the string goes on on next line.
+        """
+
+        escapes = []
+        end = -1
+
+        while True:
+            match = QUOTE_REGEXES[quote].search(line, pos)
+            if not match:
+                break
+
+            # skip escaped character
+            if match.group() == '\\':
+                escapes.append(match.start())
+                pos = match.start() +2
+                continue
+
+            end = match.end()
+            break
+
+        self.setFormat(start, (len(line) if end == -1 else end) -start, self.styles['string'])
+        if not raw:
+            for index in escapes:
+                self.setFormat(index, 2, self.styles['special'])
+
+        # triple-quotes go on until closed, simple quotes only after a final \
+        if end == -1:
+            if len(quote) == 3 or (escapes and escapes[-1] == len(line) -1):
+                self.setCurrentBlockState(self.string_states.index((quote, raw)))
+
+        return end
+
+
+def split_words(line):
+    """
+    Args:
+        line (str)
+
+    Returns:
+        (list[tuple(int, str)])
+
+    Get all words from <line>, with their start position.
+    """
+
+    return [(match.start(), match.group()) for match in WORD_REGEX.finditer(line)]
+
+def get_rule_class(language):
+    """
+    Args:
+        language (str) : language having a grammar file (see grammar module)
+
+    Returns:
+        (class)
+
+    Get a Rule class applying <language>'s grammar file only, for languages
+    with no dedicated rule class.
+    """
+
+    if not language in RULE_CLASSES:
+        RULE_CLASSES[language] = type(
+            '{}Rule'.format(language.capitalize()),
+            (Rule,),
+            {'language': language, 'grammar': language}
+        )
+
+    return RULE_CLASSES[language]
+
+def guard_pattern(pattern, start_time, language):
+    """
+    Args:
+        pattern (regex_backend.Regex or WordSet)
+        start_time (float) : time.time() before <pattern> was applied on a line
+        language (str)
+
+    Disable <pattern> for every rule if it just ran longer than
+    kk.RUNAWAY_PATTERN_TIME ms on a single line, so a pathological line does not
+    freeze the UI again on each highlight (see regex_safety to find such
+    patterns beforehand). Patterns are re-enabled by reset_runaway_patterns.
+
+    Only regex patterns applied by the main thread are timed : worker threads
+    may wait for the GIL while Maya runs a script, and WordSets can not
+    backtrack.
+    """
+
+    if isinstance(pattern, WordSet) or not is_main_thread():
+        return
+
+    spent = time.time() -start_time
+    if spent < kk.RUNAWAY_PATTERN_TIME *0.001:
+        return
+
+    RUNAWAY_PATTERNS.add(pattern)
+    PENDING_WARNINGS.append(
+        '{} highlight pattern disabled ({:.0f} ms on a single line) : {}'.format(
+            language,
+            spent *1000,
+            get_pattern_name(pattern)
+        )
+    )
+
+    if WARNINGS_SCHEDULER:
+        WARNINGS_SCHEDULER()
+    else:
+        print_warnings()
+
+def print_warnings():
+    """ Print (and forget) the pending warnings of disabled patterns. """
+
+    while PENDING_WARNINGS:
+        print (kk.WARNING_MESSAGE.format(PENDING_WARNINGS.pop(0)))
+
+def reset_runaway_patterns():
+    """ Enable again the patterns disabled by guard_pattern. """
+    RUNAWAY_PATTERNS.clear()
+
+def is_main_thread():
+    """
+    Returns:
+        (bool) : whether the current thread is the main one (Maya's UI thread)
+    """
+
+    return threading.current_thread().name == 'MainThread'
+
+def get_pattern_name(pattern):
+    """
+    Args:
+        pattern (regex_backend.Regex, WordSet, str or None)
+
+    Returns:
+        (str) : <pattern>'s readable name, for RuleProfile reports
+    """
+
+    if isinstance(pattern, WordSet):
+        words = sorted(pattern)
+        return '{} words ({}{})'.format(
+            len(words),
+            ', '.join(words[:5]),
+            ', ...' if len(words) > 5 else ''
+        )
+
+    if pattern is None:
+        return 'no delimiter'
+
+    return getattr(pattern, 'pattern', pattern)
+
+def compile_delimiters(delim_strings, docstr_close_chars, backend=None):
+    """
+    Args:
+        delim_strings (list[str]) : docstrings, strings and comments delimiters
+        docstr_close_chars (list[str])
+        backend (str, optional) : regex backend name (see regex_backend)
+
+    Returns:
+        (tuple(regex_backend.Regex or None, list[regex_backend.Regex]))
+
+    Get the scanner for the next opening delimiter in a line (as a single
+    alternation, the matched group's index being the opened state), and the
+    closing delimiter regex for each state. Compiled once for each rule class.
+    """
+
+    key = (tuple(delim_strings), tuple(docstr_close_chars), backend)
+
+    if not key in DELIM_CACHE:
+        opening = None
+        if delim_strings:
+            opening = regex_backend.get_regex(
+                '|'.join('(%s)' % delim for delim in delim_strings),
+                backend
+            )
+
+        closing = docstr_close_chars +delim_strings[len(docstr_close_chars):]
+        DELIM_CACHE[key] = (
+            opening,
+            [regex_backend.get_regex(delim, backend) for delim in closing]
+        )
+
+    return DELIM_CACHE[key]
+
+
+class LineDetector(object):
+    """
+    Language detector of log panel lines : patterns matched from the line's
+    start and patterns searched anywhere in it, compiled as a single
+    alternation. Lines containing none of the <literals> the patterns need are
+    skipped, and results are cached by line (logs repeat the same lines a lot),
+    least recently used ones being dropped above <size> lines.
+    """
+
+    def __init__(self, match_patterns, search_patterns, literals, size=None):
+        """
+        Args:
+            match_patterns (list[str]) : patterns matched from the line's start
+            search_patterns (list[str]) : patterns searched anywhere in lines
+            literals (list[str]) : lines with none of them match no pattern
+            size (int, optional) : defaults to kk.LINE_DETECTOR_CACHE_SIZE
+        """
+
+        self.regex = re.compile('^(?:{})|{}'.format(
+            '|'.join(match_patterns),
+            '|'.join(search_patterns)
+        ))
+        self.literals = literals
+
+        self.size = size or kk.LINE_DETECTOR_CACHE_SIZE
+        self.cache = collections.OrderedDict()
+        # (log rules may run in worker threads, see highlight_scheduler)
+        self.lock = threading.Lock()
+
+    def detect(self, line):
+        """
+        Args:
+            line (str)
+
+        Returns:
+            (bool) : whether any pattern matches <line>
+        """
+
+        if not any(literal in line for literal in self.literals):
+            return False
+
+        with self.lock:
+            result = self.cache.pop(line, None)
+            if result is None:
+                result = self.regex.search(line) is not None
+
+            self.cache[line] = result
+            if len(self.cache) > self.size:
+                self.cache.popitem(last=False)
+
+        return result
+
+    def clear(self):
+        with self.lock:
+            self.cache.clear()
+
+
+                    ###########################################
+                    #   detecting MEL lines in console logs   #
+                    ###########################################
+
+
+MEL_DETECTOR = LineDetector(
+    [
+        '.+;$',                                     # lines that ends with ";"
+        '\s*/\\*',                                  # /* docstrings
+        '\$.+=',                                    # $variable declaration
+        '\s*//',                                    # comment lines
+    ],
+    [
+        'proc',                                     # proc declarations
+        '\\b(true|false|none)\\b',                  # true, false, none
+        '(while|for|if|else)\s*\(.+\)\s*\{',        # while/for/if/else (...) {
+        'catch(Quiet)?\s*\(.+\)',                   # catch/catchQuiet (...)
+    ],
+    [';', '/', '$', '(', 'proc', 'true', 'false', 'none']
+)
+
+
+def is_mel_line(line):
+    """
+    Args:
+        line (str)
+
+    Returns:
+        (bool) : whether <line> looks like MEL code (see MEL_DETECTOR)
+    """
+
+    return MEL_DETECTOR.detect(line)
+
+
+                  ##############################################
+                  #   detecting Python lines in console logs   #
+                  ##############################################
+
+
+PYTHON_DETECTOR = LineDetector(
+    [
+        'from.+import.',                            # "from" imports
+        'import.',                                  # imports
+        '\s*("""|\'\'\'|#)',                        # docstrings and comment lines
+        '\s*\@\w',                                  # decorators
+    ],
+    [
+        '\\b(def|class)\\b\s*\w',                   # function and class declarations
+        '\\b(True|False|None)\\b',                  # True, False, None
+        '(while|for|if|else|try|except|finally).*:',  # (...) : declarations
+        'print(?!\()',                              # print call without ()
+    ],
+    ['import', '"""', "'''", '#', '@', 'def', 'class', 'True', 'False', 'None', ':', 'print']
+)
+
+
+def is_python_line(line):
+    """
+    Args:
+        line (str)
+
+    Returns:
+        (bool) : whether <line> looks like Python code (see PYTHON_DETECTOR)
+    """
+
+    return PYTHON_DETECTOR.detect(line)
@@ -0,0 +1,786 @@
+"""
+Deferred and time-sliced highlighting for CustomHighlighter, so large documents
+do not block Maya's UI while being highlighted.
+"""
+
+try:
+    from PySide2 import QtCore, QtGui
+except ImportError:
+    from PySide import QtGui, QtCore
+
+from custom_script_editor import constants as kk
+from custom_script_editor import regex_backend
+
+
+# flag set on block states of blocks whose formats are still to be applied
+PENDING_FLAG = 1 << 24
+# block state set by no rule, forcing Qt to highlight blocks (see RehighlightJob)
+FORCED_STATE = -2
+
+
+class LazyHighlight(QtCore.QObject):
+    """
+    Viewport-first highlighting for a CustomHighlighter.
+
+    Blocks out of the visible area (plus a margin) only get their block state
+    resolved when Qt asks for their highlight, flagged as pending. Their formats
+    are applied later, by idle-time chunks paused while the user is typing, or
+    as soon as they are scrolled into view.
+    """
+
+    def __init__(self, highlighter, text_edit):
+        """
+        Args:
+            highlighter (CustomHighlighter)
+            text_edit (QTextEdit)
+        """
+
+        super(LazyHighlight, self).__init__(highlighter)
+
+        self.highlighter = highlighter
+        self.text_edit = text_edit
+
+        self.visible_range = (0, kk.LAZY_HIGHLIGHT_MARGIN)
+        self.next_number = None         # first block number to look for pending blocks from
+        self.forced_range = None        # block numbers being highlighted from here
+        self.chunk_size = kk.LAZY_HIGHLIGHT_MARGIN
+        self.busy = False
+
+        # spans of large documents computed by a worker thread
+        self.background = None
+        if kk.BACKGROUND_HIGHLIGHT:
+            self.background = BackgroundHighlight(highlighter, text_edit)
+
+        # idle-time chunks
+        self.idle_timer = QtCore.QTimer(self)
+        self.idle_timer.setSingleShot(True)
+        self.idle_timer.timeout.connect(self.process_chunk)
+
+        # visible blocks update, once Qt is done with current highlight
+        self.view_timer = QtCore.QTimer(self)
+        self.view_timer.setSingleShot(True)
+        self.view_timer.timeout.connect(self.on_view_changed)
+
+        text_edit.verticalScrollBar().valueChanged.connect(self.on_view_changed)
+        text_edit.viewport().installEventFilter(self)
+        text_edit.document().contentsChange.connect(self.on_contents_change)
+
+    def eventFilter(self, obj, event):
+        if event.type() == QtCore.QEvent.Resize:
+            self.view_timer.start(0)
+
+        return False
+
+    def defers(self, block):
+        """
+        Args:
+            block (QtGui.QTextBlock)
+
+        Returns:
+            (bool)
+
+        Check whether <block>'s formats are to be deferred or not.
+        """
+
+        if self.forced_range:
+            first, last = self.forced_range
+            if first <= block.blockNumber() <= last:
+                return False
+
+        first, last = self.visible_range
+        return not first <= block.blockNumber() <= last
+
+    def schedule(self, block):
+        """
+        Args:
+            block (QtGui.QTextBlock) : block that just got deferred
+
+        Start idle-time highlight (if not already started).
+        """
+
+        number = block.blockNumber()
+        if self.next_number is None or number < self.next_number:
+            self.next_number = number
+
+        if not self.idle_timer.isActive():
+            self.idle_timer.start(kk.LAZY_HIGHLIGHT_TYPING_PAUSE)
+        if not self.view_timer.isActive():
+            self.view_timer.start(0)
+
+    def rehighlight_blocks(self, block, last_number):
+        """
+        Args:
+            block (QtGui.QTextBlock) : first pending block
+            last_number (int)
+
+        Returns:
+            (QtGui.QTextBlock) : next pending block
+
+        Apply deferred formats from <block> to block number <last_number>, in a
+        single Qt call (Qt goes on with next block as long as block states
+        change, which is the case of every pending block).
+        """
+
+        self.busy = True
+        self.forced_range = (block.blockNumber(), last_number)
+
+        try:
+            self.highlighter.rehighlightBlock(block)
+        finally:
+            self.forced_range = None
+            self.busy = False
+
+        while block.isValid() and not is_pending(block.userState()):
+            block = block.next()
+
+        return block
+
+    def process_chunk(self):
+        """
+        Apply deferred formats on pending blocks for at most
+        LAZY_HIGHLIGHT_CHUNK_TIME ms, and schedule the next chunk if some
+        blocks are still pending.
+        """
+
+        if self.next_number is None:
+            return
+
+        timer = QtCore.QElapsedTimer()
+        timer.start()
+
+        block = self.text_edit.document().findBlockByNumber(self.next_number)
+        background = self.background
+
+        while block.isValid() and timer.elapsed() < kk.LAZY_HIGHLIGHT_CHUNK_TIME:
+            if not is_pending(block.userState()):
+                block = block.next()
+                continue
+
+            last_number = block.blockNumber() +self.chunk_size -1
+
+            if background and background.is_computing(block.blockNumber()):
+                # only apply spans the worker already computed
+                if background.computed_number < block.blockNumber():
+                    self.next_number = block.blockNumber()
+                    self.idle_timer.start(kk.BACKGROUND_HIGHLIGHT_POLL)
+                    return
+
+                last_number = min(last_number, background.computed_number)
+
+            start_time = timer.elapsed()
+            block = self.rehighlight_blocks(block, last_number)
+
+            # adapt chunk size to the time spent on this one
+            spent = max(timer.elapsed() -start_time, 1)
+            self.chunk_size = int(self.chunk_size *kk.LAZY_HIGHLIGHT_CHUNK_TIME /spent)
+            self.chunk_size = min(max(self.chunk_size, 1), 1000)
+
+        if not block.isValid():
+            self.next_number = None
+            return
+
+        self.next_number = block.blockNumber()
+        self.idle_timer.start(0)
+
+    def on_view_changed(self, *args):
+        """
+        Update the visible blocks range, and apply deferred formats on the
+        visible pending blocks.
+        """
+
+        document = self.text_edit.document()
+        viewport = self.text_edit.viewport()
+        margin = kk.LAZY_HIGHLIGHT_MARGIN
+
+        # (document's margin is out of any block)
+        top = int(document.documentMargin()) +1
+        first = self.text_edit.cursorForPosition(QtCore.QPoint(0, top)).blockNumber()
+        last = self.text_edit.cursorForPosition(
+            QtCore.QPoint(0, viewport.height() -1)
+        ).blockNumber()
+
+        self.visible_range = (max(first -margin, 0), last +margin)
+
+        # (previous block may still be partially visible)
+        block = document.findBlockByNumber(max(first -1, 0))
+
+        while block.isValid() and block.blockNumber() <= last:
+            if is_pending(block.userState()):
+                block = self.rehighlight_blocks(block, last)
+            else:
+                block = block.next()
+
+    def on_contents_change(self, position, removed, added):
+        """
+        Args:
+            position (int)
+            removed (int)
+            added (int)
+
+        Pause idle-time highlight while the document is being edited.
+        """
+
+        # formats applied from here
+        if self.busy:
+            return
+
+        number = self.text_edit.document().findBlock(position).blockNumber()
+        if self.next_number is not None:
+            self.next_number = min(self.next_number, max(number, 0))
+
+            self.idle_timer.start(kk.LAZY_HIGHLIGHT_TYPING_PAUSE)
+
+
+class BackgroundHighlight(QtCore.QObject):
+    """
+    Span computation of large documents in a worker thread, for LazyHighlight.
+
+    Windows of BACKGROUND_HIGHLIGHT_BLOCKS lines are snapshotted from the next
+    pending block and highlighted by a SpanWorker, from QThreadPool. Results
+    fill the highlighter's span cache, so idle-time chunks only apply formats.
+    Results of a cancelled snapshot (moved window, text edit) are dropped.
+    """
+
+    # snapshot's revision, last computed block number,
+    # [(line, previous state, entry)]
+    results_ready = QtCore.Signal(int, int, object)
+
+    def __init__(self, highlighter, text_edit):
+        """
+        Args:
+            highlighter (CustomHighlighter)
+            text_edit (QTextEdit)
+        """
+
+        super(BackgroundHighlight, self).__init__(highlighter)
+
+        self.highlighter = highlighter
+        self.document = text_edit.document()
+
+        self.worker = None
+        self.revision = 0               # cancelled snapshots count
+        self.edit_revision = self.document.revision()
+        self.first_number = None        # current window's first block number
+        self.last_number = None         # current window's last block number
+        self.computed_number = None     # last block number computed in window
+
+        self.results_ready.connect(self.on_results)
+        self.document.contentsChange.connect(self.on_contents_change)
+
+    def is_enabled(self):
+        """
+        Returns:
+            (bool)
+
+        Check whether the document is large enough, and the highlighter's rule
+        expressions can be used out of the main thread.
+        """
+
+        if self.document.blockCount() < kk.BACKGROUND_HIGHLIGHT_THRESHOLD:
+            return False
+
+        backend = regex_backend.BACKENDS.get(self.highlighter.rule.regex_backend)
+        return bool(backend and backend.thread_safe)
+
+    def is_computing(self, number):
+        """
+        Args:
+            number (int) : block number
+
+        Returns:
+            (bool)
+
+        Check whether block <number>'s spans are computed by a worker thread
+        (up to computed_number). Starts a worker on the window beginning at
+        block <number> if there is none covering it yet.
+        """
+
+        if not self.is_enabled():
+            return False
+
+        if self.first_number is None or not self.first_number <= number <= self.last_number:
+            self.start(self.document.findBlockByNumber(number))
+
+        return self.first_number is not None
+
+    def start(self, block):
+        """
+        Args:
+            block (QtGui.QTextBlock) : window's first block
+
+        Snapshot lines from <block> and compute their spans in a worker thread
+        (cancels the running one).
+        """
+
+        self.cancel()
+
+        previous = block.previous()
+        previous_state = resolved_state(previous.userState()) if previous.isValid() else -1
+
+        lines = []
+        last = block
+        while last.isValid() and len(lines) < kk.BACKGROUND_HIGHLIGHT_BLOCKS:
+            lines.append(last.text())
+            last = last.next()
+
+        if not lines:
+            return
+
+        self.first_number = block.blockNumber()
+        self.last_number = self.first_number +len(lines) -1
+        self.computed_number = self.first_number -1
+
+        # (rule instance of its own, sharing compiled tables)
+        self.worker = SpanWorker(
+            self,
+            self.highlighter.rule.__class__(),
+            lines,
+            self.first_number,
+            previous_state,
+            self.revision
+        )
+        QtCore.QThreadPool.globalInstance().start(self.worker)
+
+    def cancel(self):
+        """
+        Stop the running worker, and forget its window. Results it already
+        sent are dropped (see on_results).
+        """
+
+        self.revision += 1
+        if self.worker:
+            self.worker.cancelled = True
+
+        self.worker = None
+        self.first_number = None
+        self.last_number = None
+        self.computed_number = None
+
+    def on_results(self, revision, last_number, results):
+        """
+        Args:
+            revision (int) : snapshot's revision
+            last_number (int) : last computed block number
+            results (list[tuple(str, int, tuple)]) : lines, previous states and
+                                                     span cache entries
+
+        Fill the span cache with worker's results (main thread).
+        """
+
+        if revision != self.revision or self.worker is None:
+            return
+
+        span_cache = self.highlighter.span_cache
+        for line, previous_state, entry in results:
+            span_cache.set(line, previous_state, entry)
+
+        self.computed_number = last_number
+        if last_number >= self.last_number:
+            self.worker = None
+
+    def on_contents_change(self, position, removed, added):
+        """
+        Args:
+            position (int)
+            removed (int)
+            added (int)
+
+        Drop the running snapshot on text edits. Applied formats also change
+        the document's revision, but not the one of its blocks.
+        """
+
+        revision = self.document.findBlock(position).revision()
+        if revision <= self.edit_revision:
+            return
+
+        self.edit_revision = revision
+        self.cancel()
+
+
+class SpanWorker(QtCore.QRunnable):
+    """
+    Highlight of a document snapshot's lines, in a QThreadPool thread (see
+    BackgroundHighlight). Results are sent by batches of
+    BACKGROUND_HIGHLIGHT_BATCH lines, through a queued signal.
+    """
+
+    def __init__(self, background, rule, lines, first_number, previous_state, revision):
+        """
+        Args:
+            background (BackgroundHighlight)
+            rule (highlight_rules.Rule) : used by this worker only
+            lines (list[str])
+            first_number (int) : first line's block number
+            previous_state (int) : state of the block before the first line
+            revision (int) : BackgroundHighlight's revision at snapshot time
+        """
+
+        QtCore.QRunnable.__init__(self)
+
+        self.background = background
+        self.rule = rule
+        self.lines = lines
+        self.first_number = first_number
+        self.previous_state = previous_state
+        self.revision = revision
+
+        self.cancelled = False
+
+    def run(self):
+        rule = self.rule
+        state = self.previous_state
+        results = []
+
+        for i, line in enumerate(self.lines):
+            if self.cancelled:
+                return
+
+            previous_state = state
+            try:
+                spans, state = rule.highlight(line, previous_state)
+            except Exception:
+                # the window is reported as computed anyway : lines with no
+                # cached spans are highlighted by the main thread itself
+                self.emit_results(len(self.lines) -1, results)
+                return
+
+            if not rule.is_truncated():
+                results.append((line, previous_state, (spans, state)))
+
+            if len(results) >= kk.BACKGROUND_HIGHLIGHT_BATCH or i == len(self.lines) -1:
+                if not self.emit_results(i, results):
+                    return
+
+                results = []
+
+    def emit_results(self, index, results):
+        """
+        Args:
+            index (int) : last computed line index
+            results (list[tuple(str, int, tuple)]) : lines, previous states and
+                                                     span cache entries
+
+        Returns:
+            (bool) : whether the results could be sent
+        """
+
+        try:
+            self.background.results_ready.emit(
+                self.revision,
+                self.first_number +index,
+                results
+            )
+        except RuntimeError:
+            # highlighter deleted
+            return False
+
+        return True
+
+
+class AppendHighlight(QtCore.QObject):
+    """
+    Burst highlighting of text appended to a CustomHighlighter's document (the
+    log panel, while scripts print).
+
+    Blocks from the document's last block (as of the last highlight) onwards
+    are appended ones: they only get FORCED_STATE when Qt asks for their
+    highlight, and are highlighted in a single batch once no text was appended
+    for APPEND_HIGHLIGHT_DELAY ms (or APPEND_HIGHLIGHT_MAX_DELAY ms after the
+    burst started). Only the last APPEND_HIGHLIGHT_BACKLOG blocks of a burst
+    are highlighted. Edits before the appended blocks are highlighted at once,
+    as usual.
+
+    Meant for read-only documents (see process_burst).
+    """
+
+    def __init__(self, highlighter):
+        """
+        Args:
+            highlighter (CustomHighlighter)
+        """
+
+        super(AppendHighlight, self).__init__(highlighter)
+
+        self.highlighter = highlighter
+
+        document = highlighter.document()
+
+        # last block number as of the last highlight, and first appended one
+        self.tail_number = document.blockCount() -1 if document else 0
+        self.first_number = None
+        self.busy = False
+
+        self.burst_timer = QtCore.QElapsedTimer()
+
+        self.timer = QtCore.QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.timeout.connect(self.process_burst)
+
+    def defers(self, block):
+        """
+        Args:
+            block (QtGui.QTextBlock)
+
+        Returns:
+            (bool)
+
+        Check whether <block> is an appended one, whose highlight is deferred
+        to the end of the burst.
+        """
+
+        if self.busy:
+            return False
+
+        number = block.blockNumber()
+        if self.first_number is not None and number >= self.first_number:
+            return True
+
+        if number < self.tail_number:
+            # (blocks may have been removed, like when the log is cleared)
+            self.tail_number = min(self.tail_number, block.document().blockCount() -1)
+            return False
+
+        self.first_number = number
+        return True
+
+    def schedule(self, block):
+        """
+        Args:
+            block (QtGui.QTextBlock) : block that just got deferred
+
+        Postpone the burst's highlight until no more text gets appended.
+        """
+
+        if not self.timer.isActive():
+            self.burst_timer.start()
+
+        elif self.burst_timer.elapsed() > kk.APPEND_HIGHLIGHT_MAX_DELAY:
+            return
+
+        self.timer.start(kk.APPEND_HIGHLIGHT_DELAY)
+
+    def is_pending(self):
+        """
+        Returns:
+            (bool) : whether some appended blocks are still to be highlighted
+        """
+
+        return self.first_number is not None
+
+    def blocks_removed(self, count):
+        """
+        Args:
+            count (int)
+
+        Shift tracked block numbers before <count> blocks get removed from the
+        document's start (see log_buffer.LogBuffer).
+        """
+
+        self.tail_number = max(self.tail_number -count, 0)
+        if self.first_number is not None:
+            self.first_number = max(self.first_number -count, 0)
+
+    def process_burst(self):
+        """
+        Highlight the last APPEND_HIGHLIGHT_BACKLOG appended blocks at once.
+
+        An empty char format is merged on them, so Qt highlights them from the
+        resulting contents change, where the formats of all blocks are laid out
+        in one go (rehighlightBlock lays out each block on its own, which gets
+        quadratic with large bursts).
+        """
+
+        document = self.highlighter.document()
+        if self.first_number is None or document is None:
+            self.first_number = None
+            return
+
+        first_number = max(
+            self.first_number,
+            document.blockCount() -kk.APPEND_HIGHLIGHT_BACKLOG
+        )
+        block = document.findBlockByNumber(first_number)
+        self.first_number = None
+
+        if block.isValid():
+            cursor = QtGui.QTextCursor(block)
+            cursor.movePosition(QtGui.QTextCursor.End, QtGui.QTextCursor.KeepAnchor)
+
+            # (read-only log, its undo stack is dropped rather than filled with
+            # format changes)
+            undo_enabled = document.isUndoRedoEnabled()
+            document.setUndoRedoEnabled(False)
+            self.busy = True
+
+            try:
+                cursor.mergeCharFormat(QtGui.QTextCharFormat())
+            finally:
+                self.busy = False
+                document.setUndoRedoEnabled(undo_enabled)
+
+        self.tail_number = document.blockCount() -1
+
+
+class RehighlightJob(QtCore.QObject):
+    """
+    Time-sliced rehighlight of a CustomHighlighter's whole document, used
+    instead of QSyntaxHighlighter.rehighlight when the theme or the palette
+    changes.
+
+    Blocks are highlighted in slices of at most REHIGHLIGHT_SLICE_TIME ms, one
+    slice per event loop iteration. Starting the job again cancels the running
+    pass and restarts from the first block.
+    """
+
+    # highlighted blocks count, document's blocks count
+    progress = QtCore.Signal(int, int)
+    finished = QtCore.Signal()
+
+    def __init__(self, highlighter):
+        """
+        Args:
+            highlighter (CustomHighlighter)
+        """
+
+        super(RehighlightJob, self).__init__(highlighter)
+
+        self.highlighter = highlighter
+        self.next_number = None         # first block number of next slice
+        self.slice_size = kk.LAZY_HIGHLIGHT_MARGIN
+
+        self.timer = QtCore.QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.timeout.connect(self.process_slice)
+
+    def start(self):
+        """ (Re)start rehighlight from the first block. """
+
+        self.next_number = 0
+        self.timer.start(0)
+
+    def cancel(self):
+        """ Stop rehighlight, already highlighted blocks are kept as is. """
+
+        self.timer.stop()
+        self.next_number = None
+
+    def is_running(self):
+        """
+        Returns:
+            (bool)
+        """
+
+        return self.next_number is not None
+
+    def rehighlight_blocks(self, block, last_number):
+        """
+        Args:
+            block (QtGui.QTextBlock) : slice's first block
+            last_number (int)
+
+        Returns:
+            (QtGui.QTextBlock) : next slice's first block
+
+        Highlight blocks from <block> to block number <last_number> in a single
+        Qt call: Qt goes on with next block as long as block states change, so
+        blocks before <last_number> get a block state no rule sets.
+        """
+
+        first_number = block.blockNumber()
+
+        forced_block = block
+        while forced_block.isValid() and forced_block.blockNumber() < last_number:
+            forced_block.setUserState(FORCED_STATE)
+            forced_block = forced_block.next()
+
+        lazy = self.highlighter.lazy
+        if lazy:
+            # apply formats now, and ignore the resulting document changes
+            lazy.forced_range = (first_number, last_number)
+            lazy.busy = True
+
+        try:
+            self.highlighter.rehighlightBlock(block)
+        finally:
+            if lazy:
+                lazy.forced_range = None
+                lazy.busy = False
+
+        return self.highlighter.document().findBlockByNumber(last_number +1)
+
+    def process_slice(self):
+        """
+        Highlight blocks for at most REHIGHLIGHT_SLICE_TIME ms, report progress,
+        and schedule the next slice if the document's end is not reached.
+        """
+
+        if self.next_number is None:
+            return
+
+        timer = QtCore.QElapsedTimer()
+        timer.start()
+
+        document = self.highlighter.document()
+        block = document.findBlockByNumber(self.next_number)
+
+        while block.isValid() and timer.elapsed() < kk.REHIGHLIGHT_SLICE_TIME:
+            start_time = timer.elapsed()
+            block = self.rehighlight_blocks(
+                block,
+                block.blockNumber() +self.slice_size -1
+            )
+
+            # adapt slice size to the time spent on this one
+            spent = max(timer.elapsed() -start_time, 1)
+            self.slice_size = int(self.slice_size *kk.REHIGHLIGHT_SLICE_TIME /spent)
+            self.slice_size = min(max(self.slice_size, 1), 1000)
+
+        if not block.isValid():
+            self.next_number = None
+            self.progress.emit(document.blockCount(), document.blockCount())
+            self.finished.emit()
+            return
+
+        self.next_number = block.blockNumber()
+        self.progress.emit(self.next_number, document.blockCount())
+        self.timer.start(0)
+
+
+def pending_state(state):
+    """
+    Args:
+        state (int)
+
+    Returns:
+        (int)
+
+    Get <state> flagged as pending (see LazyHighlight).
+    """
+
+    return (state +1) | PENDING_FLAG
+
+def resolved_state(state):
+    """
+    Args:
+        state (int)
+
+    Returns:
+        (int)
+
+    Get <state> without its pending flag.
+    """
+
+    if is_pending(state):
+        return (state & ~PENDING_FLAG) -1
+    return state
+
+def is_pending(state):
+    """
+    Args:
+        state (int)
+
+    Returns:
+        (bool)
+    """
+
+    return state > -1 and bool(state & PENDING_FLAG)
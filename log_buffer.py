@@ -0,0 +1,228 @@
+"""
+Bounded Script Editor log panel : its oldest lines are removed once it holds
+more than LOG_BUFFER_MAX_BLOCKS blocks, and written to a rotating archive file
+on disk (see LogArchive), so Maya's memory stays flat in long sessions.
+"""
+
+import io
+import os
+
+try:
+    from PySide2 import QtCore, QtGui
+except ImportError:
+    from PySide import QtGui, QtCore
+
+from custom_script_editor import constants as kk
+from custom_script_editor import highlight_scheduler
+from custom_script_editor import log_view
+
+
+class LogBuffer(QtCore.QObject):
+    """
+    Caps the blocks count of a log QTextEdit's document.
+
+    When the document exceeds LOG_BUFFER_MAX_BLOCKS blocks, its first blocks
+    are removed down to LOG_BUFFER_MAX_BLOCKS -LOG_BUFFER_TRIM_BLOCKS, in a
+    single edit (so the document is laid out and highlighted once for each
+    trim, not for each line), and archived if LOG_ARCHIVE is enabled.
+
+    Trims are deferred to the event loop, as the document can not be edited
+    from its own change signals.
+    """
+
+    def __init__(self, text_edit):
+        """
+        Args:
+            text_edit (QtWidgets.QTextEdit) : Script Editor's log panel
+        """
+
+        super(LogBuffer, self).__init__(text_edit)
+
+        self.text_edit = text_edit
+
+        self.archive = None
+        if kk.LOG_ARCHIVE:
+            self.archive = LogArchive(get_archive_path())
+
+        self.timer = QtCore.QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.timeout.connect(self.trim)
+
+        text_edit.document().blockCountChanged.connect(self.schedule)
+        self.schedule(text_edit.document().blockCount())
+
+    def schedule(self, count):
+        """
+        Args:
+            count (int) : document's blocks count
+
+        Trim the document on next event loop iteration if it exceeds
+        LOG_BUFFER_MAX_BLOCKS blocks.
+        """
+
+        if count > kk.LOG_BUFFER_MAX_BLOCKS and not self.timer.isActive():
+            self.timer.start(0)
+
+    def trim(self):
+        """
+        Remove (and archive) the document's first blocks, keeping its last
+        LOG_BUFFER_MAX_BLOCKS -LOG_BUFFER_TRIM_BLOCKS ones.
+        """
+
+        document = self.text_edit.document()
+        if document.blockCount() <= kk.LOG_BUFFER_MAX_BLOCKS:
+            return
+
+        keep = max(kk.LOG_BUFFER_MAX_BLOCKS -kk.LOG_BUFFER_TRIM_BLOCKS, 1)
+        count = document.blockCount() -keep
+        first_kept = document.findBlockByNumber(count)
+
+        if self.archive:
+            lines = []
+            block = document.firstBlock()
+            while block.isValid() and block != first_kept:
+                lines.append(block.text())
+                block = block.next()
+
+            self.archive.write(lines)
+
+        # view's first visible block, to scroll back to it after the trim
+        scroll_bar = self.text_edit.verticalScrollBar()
+        at_bottom = scroll_bar.value() == scroll_bar.maximum()
+        top_block = self.text_edit.cursorForPosition(QtCore.QPoint(0, 0)).block()
+        top_number = top_block.blockNumber()
+        top_offset = scroll_bar.value() -document.documentLayout().blockBoundingRect(top_block).top()
+
+        # (blocks appended to the log and still to be highlighted are tracked
+        # by number)
+        for append in self.text_edit.findChildren(highlight_scheduler.AppendHighlight):
+            append.blocks_removed(count)
+
+        # (views mirroring the log get the lines before they are removed)
+        for view in self.text_edit.findChildren(log_view.LogView):
+            view.update_lines()
+
+        cursor = QtGui.QTextCursor(document)
+        cursor.setPosition(first_kept.position(), QtGui.QTextCursor.KeepAnchor)
+
+        # (the undo stack would keep removed text in memory)
+        undo_enabled = document.isUndoRedoEnabled()
+        document.setUndoRedoEnabled(False)
+
+        try:
+            cursor.beginEditBlock()
+            cursor.removeSelectedText()
+            cursor.endEditBlock()
+        finally:
+            document.setUndoRedoEnabled(undo_enabled)
+
+        if at_bottom:
+            scroll_bar.setValue(scroll_bar.maximum())
+        elif top_number >= count:
+            top_block = document.findBlockByNumber(top_number -count)
+            rect = document.documentLayout().blockBoundingRect(top_block)
+            scroll_bar.setValue(int(rect.top() +top_offset))
+
+    def get_archive_files(self):
+        """
+        Returns:
+            (list[str]) : archive files removed lines were written to, most
+                          recent first (rotated files included)
+        """
+
+        if not self.archive:
+            return []
+        return self.archive.get_files()
+
+
+class LogArchive(object):
+    """
+    Text file lines are appended to, rotated once larger than <max_size> bytes
+    (<path> is renamed as <path>.1, <path>.1 as <path>.2, and so on), keeping
+    at most <count> rotated files.
+    """
+
+    def __init__(self, path, max_size=None, count=None):
+        """
+        Args:
+            path (str)
+            max_size (int, optional) : defaults to kk.LOG_ARCHIVE_SIZE
+            count (int, optional) : defaults to kk.LOG_ARCHIVE_COUNT
+        """
+
+        self.path = path
+        self.max_size = max_size or kk.LOG_ARCHIVE_SIZE
+        self.count = kk.LOG_ARCHIVE_COUNT if count is None else count
+
+    def write(self, lines):
+        """
+        Args:
+            lines (list[str])
+
+        Append <lines> to the archive file, rotating it first if it exceeds
+        the archive's size.
+        """
+
+        try:
+            folder = os.path.dirname(self.path)
+            if not os.path.isdir(folder):
+                os.makedirs(folder)
+
+            if os.path.isfile(self.path) and os.path.getsize(self.path) > self.max_size:
+                self.rotate()
+
+            with io.open(self.path, 'a', encoding='utf-8') as opened_file:
+                for line in lines:
+                    opened_file.write(u'{}\n'.format(line))
+
+        except (IOError, OSError) as e:
+            # no writable archive folder, lines are dropped
+            print (kk.WARNING_MESSAGE.format('log lines not archived ({})'.format(e)))
+
+    def rotate(self):
+        """ Shift rotated files by one, dropping the oldest one. """
+
+        if not self.count:
+            os.remove(self.path)
+            return
+
+        for i in range(self.count, 0, -1):
+            source = self.get_file(i -1)
+            if not os.path.isfile(source):
+                continue
+
+            target = self.get_file(i)
+            if os.path.isfile(target):
+                os.remove(target)
+            os.rename(source, target)
+
+    def get_file(self, index):
+        """
+        Args:
+            index (int) : rotation index, 0 being the file currently written
+
+        Returns:
+            (str)
+        """
+
+        if not index:
+            return self.path
+        return '{}.{}'.format(self.path, index)
+
+    def get_files(self):
+        """
+        Returns:
+            (list[str]) : existing archive files, most recent first
+        """
+
+        files = [self.get_file(i) for i in range(self.count +1)]
+        return [path for path in files if os.path.isfile(path)]
+
+
+def get_archive_path():
+    """
+    Returns:
+        (str) : archive file of current Maya session's log panel
+    """
+
+    return os.path.join(kk.LOG_ARCHIVE_DIR, 'script_editor_{}.log'.format(os.getpid()))
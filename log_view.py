@@ -0,0 +1,527 @@
+"""
+Virtualized Script Editor log view : a single column QTableView shown over the
+log panel, over a model of the panel's lines kept in a bounded in-memory window
+with older lines spilled to disk (see RingStore). Rows are highlighted with
+LogRule only when painted, so long logs cost neither memory nor layout time.
+"""
+
+import collections
+import tempfile
+
+try:
+    from PySide2 import QtWidgets, QtGui, QtCore
+except ImportError:
+    from PySide import QtGui, QtCore
+    from PySide import QtGui as QtWidgets
+
+from custom_script_editor import constants as kk
+from custom_script_editor import palette
+from custom_script_editor.highlight_rules import LogRule
+from custom_script_editor.syntax_highlight import SpanCache, get_format_table
+
+
+STYLE_PATTERN = 'QTableView {{ color: rgb{}; background: rgb{}; }}'
+
+
+class RingStore(object):
+    """
+    Append-only lines store : the last <size> lines are kept in memory, older
+    ones are spilled to a temporary file by chunks of <chunk> lines, and read
+    back by chunks (the last LOG_VIEW_SPILL_CACHE read chunks are kept). Only
+    the last line can be replaced (as the log panel's last line grows until
+    its line break).
+    """
+
+    def __init__(self, size=None, chunk=None):
+        """
+        Args:
+            size (int, optional) : defaults to kk.LOG_VIEW_MEMORY_LINES
+            chunk (int, optional) : defaults to kk.LOG_VIEW_SPILL_CHUNK
+        """
+
+        self.chunk = chunk or kk.LOG_VIEW_SPILL_CHUNK
+        # (at least a chunk, so the last line is never spilled)
+        self.size = max(size or kk.LOG_VIEW_MEMORY_LINES, self.chunk)
+
+        self.lines = []
+        self.spilled = 0
+
+        # spilled chunks start offsets, and chunks read back
+        self.offsets = []
+        self.spill_file = None
+        self.chunks = collections.OrderedDict()
+
+    def __len__(self):
+        return self.spilled +len(self.lines)
+
+    def get(self, row):
+        """
+        Args:
+            row (int)
+
+        Returns:
+            (str)
+        """
+
+        if row >= self.spilled:
+            return self.lines[row -self.spilled]
+
+        index, line_index = divmod(row, self.chunk)
+        return self.get_chunk(index)[line_index]
+
+    def extend(self, lines):
+        """
+        Args:
+            lines (list[str])
+
+        Append <lines>, spilling the oldest in-memory ones above the store's
+        size.
+        """
+
+        self.lines.extend(lines)
+
+        while len(self.lines) > self.size:
+            self.spill(self.lines[:self.chunk])
+            del self.lines[:self.chunk]
+
+    def replace_last(self, line):
+        """
+        Args:
+            line (str)
+        """
+
+        self.lines[-1] = line
+
+    def spill(self, lines):
+        """
+        Args:
+            lines (list[str]) : a chunk of lines
+
+        Write <lines> at the end of the spill file.
+        """
+
+        if self.spill_file is None:
+            self.spill_file = tempfile.TemporaryFile(prefix='log_view_')
+
+        self.spill_file.seek(0, 2)
+        self.offsets.append(self.spill_file.tell())
+        self.spill_file.write(u'\n'.join(lines).encode('utf-8'))
+
+        self.spilled += len(lines)
+
+    def get_chunk(self, index):
+        """
+        Args:
+            index (int)
+
+        Returns:
+            (list[str]) : <index>th spilled chunk's lines
+        """
+
+        lines = self.chunks.pop(index, None)
+
+        if lines is None:
+            start = self.offsets[index]
+            self.spill_file.seek(start)
+
+            if index +1 < len(self.offsets):
+                data = self.spill_file.read(self.offsets[index +1] -start)
+            else:
+                data = self.spill_file.read()
+
+            lines = data.decode('utf-8').split(u'\n')
+
+        self.chunks[index] = lines
+        if len(self.chunks) > kk.LOG_VIEW_SPILL_CACHE:
+            self.chunks.popitem(last=False)
+
+        return lines
+
+    def close(self):
+        """ Drop the spill file (lines are not readable anymore). """
+
+        if self.spill_file is not None:
+            self.spill_file.close()
+            self.spill_file = None
+
+
+class LogModel(QtCore.QAbstractListModel):
+    """
+    List model of log lines, stored in a RingStore. Highlight spans are only
+    computed for requested rows (see get_spans).
+    """
+
+    def __init__(self, parent=None):
+        super(LogModel, self).__init__(parent)
+
+        self.store = RingStore()
+        self.rule = LogRule()
+
+        # lines highlight results, as style keys, and rows block states
+        self.span_cache = SpanCache()
+        self.states = collections.OrderedDict()
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        """ Qt re-implementation. """
+
+        if parent.isValid():
+            return 0
+        return len(self.store)
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        """ Qt re-implementation. """
+
+        if role == QtCore.Qt.DisplayRole and index.isValid():
+            return self.store.get(index.row())
+        return None
+
+    def extend(self, lines):
+        """
+        Args:
+            lines (list[str])
+        """
+
+        if not lines:
+            return
+
+        first = len(self.store)
+        self.beginInsertRows(QtCore.QModelIndex(), first, first +len(lines) -1)
+        self.store.extend(lines)
+        self.endInsertRows()
+
+    def replace_last(self, line):
+        """
+        Args:
+            line (str)
+        """
+
+        row = len(self.store) -1
+        self.store.replace_last(line)
+        self.states.pop(row, None)
+
+        index = self.index(row)
+        self.dataChanged.emit(index, index)
+
+    def get_spans(self, row):
+        """
+        Args:
+            row (int)
+
+        Returns:
+            (list[tuple(int, int, tuple)]) : see highlight_rules.LineFormats.get_spans
+        """
+
+        line = self.store.get(row)
+        previous_state = self.get_previous_state(row)
+
+        cached = self.span_cache.get(line, previous_state)
+        if not cached:
+            cached = self.rule.highlight(line, previous_state)
+            if not self.rule.is_truncated():
+                self.span_cache.set(line, previous_state, cached)
+
+        self.set_state(row, cached[1])
+        return cached[0]
+
+    def get_previous_state(self, row):
+        """
+        Args:
+            row (int)
+
+        Returns:
+            (int) : block state of the line before <row>
+
+        Resolve states from the closest known one, looking back
+        LOG_VIEW_STATE_LOOKBACK lines at most (rows are painted from top to
+        bottom, so the previous one is usually known).
+        """
+
+        first = max(row -kk.LOG_VIEW_STATE_LOOKBACK, 0)
+
+        known = row -1
+        while known >= first and not known in self.states:
+            known -= 1
+
+        state = self.states[known] if known >= first else -1
+
+        for i in range(known +1, row):
+            state = self.rule.resolve_state(self.store.get(i), state)
+            self.set_state(i, state)
+
+        return state
+
+    def set_state(self, row, state):
+        """
+        Args:
+            row (int)
+            state (int)
+        """
+
+        self.states[row] = state
+        if len(self.states) > kk.SPAN_CACHE_SIZE:
+            self.states.popitem(last=False)
+
+
+class LogDelegate(QtWidgets.QStyledItemDelegate):
+    """
+    Paints log rows with their highlight formats (see LogView.formats).
+    """
+
+    def paint(self, painter, option, index):
+        """ Qt re-implementation. """
+
+        view = self.parent()
+        painter.save()
+
+        if option.state & QtWidgets.QStyle.State_Selected:
+            painter.fillRect(option.rect, option.palette.highlight())
+
+        ranges = []
+        for start, length, style in index.model().get_spans(index.row()):
+            txt_format = view.formats.get(style)
+            if txt_format is None:
+                continue
+
+            format_range = QtGui.QTextLayout.FormatRange()
+            format_range.start = start
+            format_range.length = length
+            format_range.format = txt_format
+            ranges.append(format_range)
+
+        layout = QtGui.QTextLayout(index.data(), option.font)
+        # (setFormats is Qt 5.6+)
+        if hasattr(layout, 'setFormats'):
+            layout.setFormats(ranges)
+        else:
+            layout.setAdditionalFormats(ranges)
+
+        layout.beginLayout()
+        layout.createLine()
+        layout.endLayout()
+
+        painter.setPen(view.text_color)
+        layout.draw(painter, QtCore.QPointF(option.rect.topLeft()))
+
+        painter.restore()
+
+
+class LogView(QtWidgets.QTableView):
+    """
+    Virtualized view of a log QTextEdit's lines, shown over it.
+
+    A QTableView with fixed rows height and hidden headers, rather than a
+    QListView : QListView lays out every row again on each rows insertion,
+    while table rows positions are computed from their count.
+
+    The QTextEdit's document is mirrored : lines from its last block (as of
+    the last update) onwards are added to the model, by batches once no text
+    was appended for LOG_VIEW_FLUSH_DELAY ms. The model keeps the lines
+    removed from the document afterwards (log_buffer.LogBuffer updates the
+    view before each trim).
+    """
+
+    def __init__(self, text_edit):
+        """
+        Args:
+            text_edit (QtWidgets.QTextEdit) : Script Editor's log panel
+        """
+
+        super(LogView, self).__init__(text_edit)
+
+        self.text_edit = text_edit
+        # (palettes style sheets select widgets by name)
+        self.setObjectName('{}LogView'.format(text_edit.objectName()))
+
+        self.setFont(text_edit.font())
+        self.setShowGrid(False)
+        self.setWordWrap(False)
+        self.setSelectionBehavior(QtWidgets.QAbstractItemView.SelectRows)
+        self.setSelectionMode(QtWidgets.QAbstractItemView.ExtendedSelection)
+
+        row_height = self.fontMetrics().height()
+        self.verticalHeader().hide()
+        self.verticalHeader().setMinimumSectionSize(row_height)
+        self.verticalHeader().setDefaultSectionSize(row_height)
+        # (long lines are scrolled to, not wrapped)
+        self.horizontalHeader().hide()
+        self.horizontalHeader().setDefaultSectionSize(kk.INF_WIDTH)
+
+        self.setModel(LogModel(self))
+        self.setItemDelegate(LogDelegate(self))
+        self.init_palettes()
+
+        # start of the last mirrored block, kept on text inserted at it
+        document = text_edit.document()
+        self.cursor = QtGui.QTextCursor(document)
+        self.cursor.setKeepPositionOnInsert(True)
+
+        self.burst_timer = QtCore.QElapsedTimer()
+
+        self.timer = QtCore.QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.timeout.connect(self.update_lines)
+
+        self.model().extend(get_lines(document.firstBlock()))
+        self.cursor.setPosition(document.lastBlock().position())
+        self.scrollToBottom()
+
+        document.contentsChange.connect(self.schedule)
+
+        # (follows the log panel's geometry)
+        self.setGeometry(text_edit.rect())
+        text_edit.installEventFilter(self)
+
+    def init_palettes(self):
+        """
+        Get log panel palettes' formats (see
+        syntax_highlight.LogHighlighter.init_rule), and their colors on the
+        view.
+        """
+
+        palettes = [
+            palette.MelPalette(self),
+            palette.PythonPalette(self),
+            palette.LogPalette(self)
+        ]
+
+        # (keeps shared tables referenced)
+        self.format_tables = [get_format_table(p) for p in palettes]
+        self.formats = {}
+        for format_table in self.format_tables:
+            self.formats.update(format_table)
+
+        # (palettes style sheets only apply to QTextEdits)
+        log_palette = palettes[-1]
+        self.text_color = QtGui.QColor(*log_palette.get_color('normal'))
+        self.setStyleSheet(STYLE_PATTERN.format(
+            log_palette.get_color('normal'),
+            log_palette.get_color('background')
+        ))
+
+    def schedule(self, *args):
+        """
+        Update the view once no text was appended for LOG_VIEW_FLUSH_DELAY ms
+        (or LOG_VIEW_FLUSH_MAX_DELAY ms after the burst started).
+        """
+
+        if not self.timer.isActive():
+            self.burst_timer.start()
+
+        elif self.burst_timer.elapsed() > kk.LOG_VIEW_FLUSH_MAX_DELAY:
+            return
+
+        self.timer.start(kk.LOG_VIEW_FLUSH_DELAY)
+
+    def update_lines(self):
+        """
+        Add the log panel's lines appended since the last update to the model.
+        """
+
+        model = self.model()
+        scroll_bar = self.verticalScrollBar()
+        at_bottom = scroll_bar.value() == scroll_bar.maximum()
+
+        lines = get_lines(self.cursor.block())
+
+        # the last mirrored line may have grown (if it had no line break yet),
+        # unless the log was cleared
+        if model.rowCount() and lines:
+            last_line = model.store.get(model.rowCount() -1)
+            line = lines.pop(0)
+
+            if line != last_line and line.startswith(last_line):
+                model.replace_last(line)
+            elif line != last_line and line:
+                lines.insert(0, line)
+
+        model.extend(lines)
+        self.cursor.setPosition(self.text_edit.document().lastBlock().position())
+
+        if at_bottom:
+            self.scrollToBottom()
+
+    def eventFilter(self, obj, event):
+        """ Qt re-implementation, resizing the view along the log panel. """
+
+        if obj is self.text_edit and event.type() == QtCore.QEvent.Resize:
+            self.setGeometry(self.text_edit.rect())
+        return False
+
+    def mousePressEvent(self, event):
+        """ Qt re-implementation, leaving right clicks to the log panel. """
+
+        if event.button() == QtCore.Qt.RightButton:
+            self.forward_mouse_event(event)
+            return
+
+        super(LogView, self).mousePressEvent(event)
+
+    def mouseReleaseEvent(self, event):
+        """ Qt re-implementation, leaving right clicks to the log panel. """
+
+        if event.button() == QtCore.Qt.RightButton:
+            self.forward_mouse_event(event)
+            return
+
+        super(LogView, self).mouseReleaseEvent(event)
+
+    def forward_mouse_event(self, event):
+        """
+        Args:
+            event (QtGui.QMouseEvent)
+
+        Send <event> to the log panel's viewport (Maya's hotbox menu, with the
+        Custom Menu, opens from there).
+        """
+
+        viewport = self.text_edit.viewport()
+        QtWidgets.QApplication.sendEvent(viewport, QtGui.QMouseEvent(
+            event.type(),
+            viewport.mapFromGlobal(event.globalPos()),
+            event.globalPos(),
+            event.button(),
+            event.buttons(),
+            event.modifiers()
+        ))
+
+    def keyPressEvent(self, event):
+        """ Qt re-implementation, copying selected lines. """
+
+        if event.matches(QtGui.QKeySequence.Copy):
+            rows = sorted(index.row() for index in self.selectedIndexes())
+            QtWidgets.QApplication.clipboard().setText(
+                '\n'.join(self.model().store.get(row) for row in rows)
+            )
+            return
+
+        super(LogView, self).keyPressEvent(event)
+
+    def remove(self):
+        """ Remove the view from the log panel, and drop its lines. """
+
+        self.text_edit.document().contentsChange.disconnect(self.schedule)
+        self.text_edit.removeEventFilter(self)
+        self.timer.stop()
+
+        self.model().store.close()
+        self.hide()
+        # (not found among the log panel's children anymore)
+        self.setParent(None)
+        self.deleteLater()
+
+
+def get_lines(block):
+    """
+    Args:
+        block (QtGui.QTextBlock)
+
+    Returns:
+        (list[str]) : lines of <block> and the following blocks
+    """
+
+    lines = []
+    while block.isValid():
+        lines.append(block.text())
+        block = block.next()
+
+    return lines
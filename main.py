@@ -5,6 +5,7 @@ Script for customizing Maya's script editor hightlights and hotkeys.
 
 import re
 import traceback
+from functools import partial
 
 from PySide2 import QtWidgets, QtCore, QtGui
 
@@ -16,6 +17,9 @@ import shiboken2 as shiboken
 
 from custom_script_editor.tools import menu as tools_menu
 from custom_script_editor import syntax_highlight
+from custom_script_editor import highlight_rules
+from custom_script_editor import log_buffer
+from custom_script_editor import log_view
 from custom_script_editor import keys
 from custom_script_editor import snippets
 from custom_script_editor import palette
@@ -204,6 +208,116 @@ def set_logs_word_wrap(enabled):
     else:
         log_field.setLineWrapMode(log_field.NoWrap)
 
+def set_logs_view(enabled):
+    """
+    Args:
+        enabled (bool)
+
+    Show the virtualized log view over the log panel if <enabled>, remove it
+    otherwise (see log_view.LogView).
+    """
+
+    log_field = get_logs_text_edit()
+    if not log_field:
+        return
+
+    views = log_field.findChildren(log_view.LogView)
+
+    if enabled and not views:
+        view = log_view.LogView(log_field)
+        view.show()
+
+    if not enabled:
+        for view in views:
+            view.remove()
+
+def open_log_archive(*args):
+    """
+    Open the files log panel's removed lines were archived to, oldest first
+    (so the most recent one is opened last).
+    """
+
+    log_field = get_logs_text_edit()
+    if not log_field:
+        return
+
+    for buffer_handle in log_field.findChildren(log_buffer.LogBuffer):
+        archive_files = buffer_handle.get_archive_files()
+        for archive_file in reversed(archive_files):
+            QtGui.QDesktopServices.openUrl(QtCore.QUrl.fromLocalFile(archive_file))
+
+        if archive_files:
+            return
+
+    print kk.INFO_MESSAGE.format('no log lines archived yet.')
+
+def get_tab_text_edit(popup_menu):
+    """
+    Args:
+        popup_menu (str) : script tab's hotbox menu
+
+    Returns:
+        (QTextEdit or None)
+
+    Get the script QTextEdit from the tab <popup_menu> belongs to.
+    """
+
+    se_tab_lay = get_scripts_tab_lay()
+    if not se_tab_lay:
+        return None
+
+    for form_lay in mc.tabLayout(se_tab_lay, q=True, childArray=True) or ():
+        if not form_lay in popup_menu:
+            continue
+
+        ptr = OMUI.MQtUtil.findControl(form_lay)
+        widget = shiboken.wrapInstance(long(ptr), QtWidgets.QWidget)
+
+        for txt_edit in get_text_edits(widget):
+            if 'cmdScrollFieldExecuter' in txt_edit.objectName():
+                return txt_edit
+
+def set_python_engine(popup_menu, enabled):
+    """
+    Args:
+        popup_menu (str) : script tab's hotbox menu
+        enabled (bool)
+
+    Switch <popup_menu>'s tab Python highlighter on tokenizer engine if
+    <enabled>, on regex one otherwise.
+    """
+
+    txt_edit = get_tab_text_edit(popup_menu)
+    if not txt_edit:
+        return
+
+    for highlight in txt_edit.findChildren(syntax_highlight.PythonHighlighter):
+        highlight.set_engine('tokenizer' if enabled else 'regex')
+
+def set_highlight_profile(enabled):
+    """
+    Args:
+        enabled (bool)
+
+    Start or stop recording highlighting rules statistics.
+    """
+
+    highlight_rules.PROFILE.enabled = enabled
+
+def print_highlight_profile(*args):
+    """ Print the slowest highlighting patterns, with their statistics. """
+
+    for line in highlight_rules.PROFILE.get_report():
+        print kk.INFO_MESSAGE.format(line)
+
+def clear_highlight_profile(*args):
+    """ Forget recorded highlighting rules statistics. """
+    highlight_rules.PROFILE.clear()
+
+def reset_runaway_patterns(*args):
+    """ Enable again the highlighting patterns disabled for running too long. """
+    highlight_rules.reset_runaway_patterns()
+
 def add_custom_menus():
     """ Add custom menus to the Script Editor's tabs hotbox menu. """
 
@@ -224,6 +338,13 @@ def add_custom_menus():
                 label='Snippets',
                 checkBox=True
             )
+            mc.menuItem(
+                kk.TOKENIZER_BOX_NAME,
+                p=main_menu,
+                label='Tokenizer highlight',
+                checkBox=kk.PYTHON_HIGHLIGHT_ENGINE == 'tokenizer',
+                command=partial(set_python_engine, menu)
+            )
 
         if 'cmdScrollFieldReporter' in menu:   # logs panel
             mc.menuItem(
@@ -234,6 +355,40 @@ def add_custom_menus():
                 checkBox=False,
                 command=set_logs_word_wrap
             )
+            mc.menuItem(
+                kk.LOG_VIEW_BOX_NAME,
+                p=main_menu,
+                label='Virtualized view',
+                checkBox=False,
+                command=set_logs_view
+            )
+            mc.menuItem(
+                'LogArchive',
+                p=main_menu,
+                label='Open log archive',
+                command=open_log_archive
+            )
+
+        profile_menu = mc.menuItem(
+            'HighlightProfile',
+            p=main_menu,
+            subMenu=True,
+            label='Highlighter profile'
+        )
+        mc.menuItem(
+            kk.PROFILE_BOX_NAME,
+            p=profile_menu,
+            label='Record',
+            checkBox=highlight_rules.PROFILE.enabled,
+            command=set_highlight_profile
+        )
+        mc.menuItem(p=profile_menu, label='Print report', command=print_highlight_profile)
+        mc.menuItem(p=profile_menu, label='Clear', command=clear_highlight_profile)
+        mc.menuItem(
+            p=profile_menu,
+            label='Enable disabled patterns',
+            command=reset_runaway_patterns
+        )
 
         mc.menuItem(
             'ScriptTools',
@@ -278,6 +433,10 @@ def customize_script_editor(*args):
 
         highlight.rehighlight()
 
+    # cap the logs panel blocks count, archiving the oldest lines
+    if log_field and kk.LOG_BUFFER and child_class_needed(log_field, log_buffer.LogBuffer):
+        log_buffer.LogBuffer(log_field)
+
     se_tab_lay = get_scripts_tab_lay()
     if not se_tab_lay:
         return
@@ -349,6 +508,9 @@ def run():
     maya_ui = OMUI.MQtUtil.mainWindow()
     maya_ui_qt = shiboken.wrapInstance(long(maya_ui), QtWidgets.QMainWindow)
 
+    # read all palettes once, so tabs customization does not read any file
+    palette.preload_palettes()
+
     # install ScriptEditorDetector event filter on Maya window if not already
     if child_class_needed(maya_ui_qt, ScriptEditorDetector):
         ui_filter = ScriptEditorDetector(parent=maya_ui_qt)
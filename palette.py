@@ -3,12 +3,13 @@ Color management for Synthax highglighters. These are no QtGui.QPalette objects.
 """
 
 import os
+import copy
 import json
 
 try:
     from PySide2 import QtWidgets, QtGui, QtCore
 except ImportError:
-    from PySide import QtGui
+    from PySide import QtGui, QtCore
     from PySide import QtGui as QtWidgets
 
 from custom_script_editor import constants as kk
@@ -24,6 +25,11 @@ QTextEdit#%(object_name)s {
 
 PALETTES_ROOT = os.path.join(os.path.dirname(__file__), 'palettes')
 
+# parsed json palettes, by file path (see get_palette)
+PALETTES_CACHE = {}
+# watches cached palette files, to drop them from cache once modified
+PALETTES_WATCHER = None
+
 
 class Palette(object):
     """
@@ -35,6 +41,7 @@ class Palette(object):
     def __init__(self, widget, padding=True):
 
         self.root_type = None
+        self.theme = None
         self.widget = widget
         self.palette = {}
         self.padding = padding
@@ -48,6 +55,8 @@ class Palette(object):
         Apply <theme>.json palette on <widget>.
         """
 
+        self.theme = theme
+
         theme = self.root_type +'/' +theme if self.root_type else theme
         self.palette = get_palette(theme)
         self.set_stylesheet()
@@ -209,7 +218,66 @@ def get_palette(theme):
     Get the <theme> palette from the according json file.
     """
 
-    palette_file = os.path.join(PALETTES_ROOT, '{}.json'.format(theme))
+    palette_file = os.path.normpath(
+        os.path.join(PALETTES_ROOT, '{}.json'.format(theme))
+    )
+
+    if not palette_file in PALETTES_CACHE:
+        load_palette(palette_file)
+
+    # (copied as palettes are edited by Palette.set_color)
+    return copy.deepcopy(PALETTES_CACHE[palette_file])
+
+def load_palette(palette_file):
+    """
+    Args:
+        palette_file (str)
+
+    Parse <palette_file> into PALETTES_CACHE, and watch it for modifications.
+    """
 
     with open(palette_file, 'r') as opened_file:
-        return json.load(opened_file)
+        PALETTES_CACHE[palette_file] = json.load(opened_file)
+
+    watcher = get_palettes_watcher()
+    if watcher and not palette_file in watcher.files():
+        watcher.addPath(palette_file)
+
+def preload_palettes():
+    """
+    Load every json palette under PALETTES_ROOT (template files included), so
+    highlighters and palette editor do not read palette files anymore.
+    """
+
+    for root, _, files in os.walk(PALETTES_ROOT):
+        for file_name in files:
+            palette_file = os.path.normpath(os.path.join(root, file_name))
+
+            if file_name.endswith('.json') and not palette_file in PALETTES_CACHE:
+                load_palette(palette_file)
+
+def get_palettes_watcher():
+    """
+    Returns:
+        (QtCore.QFileSystemWatcher or None) : None if there is no Qt application
+                                              yet
+    """
+
+    global PALETTES_WATCHER
+
+    if PALETTES_WATCHER is None and QtCore.QCoreApplication.instance():
+        PALETTES_WATCHER = QtCore.QFileSystemWatcher()
+        PALETTES_WATCHER.fileChanged.connect(on_palette_file_changed)
+
+    return PALETTES_WATCHER
+
+def on_palette_file_changed(palette_file):
+    """
+    Args:
+        palette_file (str)
+
+    Drop modified (or deleted) <palette_file> from cache, to be read again on
+    next get_palette call.
+    """
+
+    PALETTES_CACHE.pop(os.path.normpath(palette_file), None)
@@ -0,0 +1,379 @@
+"""
+Regular expression backends for highlighting rules. Python's re module, Qt's
+QRegularExpression (PCRE, JIT-compiled once optimized) and Qt's legacy QRegExp
+are wrapped behind the same API, so each language can use the fastest one
+available in Maya's build (see constants.REGEX_BACKENDS and compare_backends).
+"""
+
+import re
+import time
+
+try:
+    from PySide2 import QtCore
+except ImportError:
+    try:
+        from PySide import QtCore
+    except ImportError:
+        # re only (see highlight_rules)
+        QtCore = None
+
+from custom_script_editor import constants as kk
+
+
+# compiled expressions, by (backend name, pattern) (see get_regex)
+REGEX_CACHE = {}
+
+
+class Regex(object):
+    """
+    Base class for compiled expressions. Backends re-implement :
+
+        search(line, pos=0) : first match from <pos> (re.Match-like, with
+                              start, end and lastindex support), or None
+        spans(line, nth) : start and length of the <nth> group, for each
+                           match. Each search starts again from the end of
+                           the previous <nth> group (as Rule.apply_rule always
+                           did with QRegExp)
+    """
+
+    name = None
+    # whether compiled expressions can be used by several threads at once
+    # (see highlight_scheduler.BackgroundHighlight)
+    thread_safe = False
+
+    def __init__(self, pattern):
+        """
+        Args:
+            pattern (str)
+        """
+
+        self.pattern = pattern
+
+    @classmethod
+    def is_available(cls):
+        """
+        Returns:
+            (bool) : whether the backend exists in current Qt/Python build
+        """
+
+        return True
+
+    def is_valid(self):
+        """
+        Returns:
+            (bool) : whether the pattern compiled with this backend
+        """
+
+        return True
+
+
+class ReRegex(Regex):
+    """
+    Python's re module.
+    """
+
+    name = 're'
+    thread_safe = True
+
+    def __init__(self, pattern):
+        Regex.__init__(self, pattern)
+
+        try:
+            self.regex = re.compile(pattern, re.UNICODE)
+        except re.error:
+            self.regex = None
+
+    def is_valid(self):
+        return self.regex is not None
+
+    def search(self, line, pos=0):
+        return self.regex.search(line, pos)
+
+    def spans(self, line, nth):
+        result = []
+        match = self.regex.search(line)
+
+        while match:
+            start, end = match.span(nth)
+            if start > -1:
+                result.append((start, end -start))
+
+            match = self.regex.search(line, max(end, match.start() +1))
+
+        return result
+
+
+class QRegularExpressionRegex(Regex):
+    """
+    Qt5's QRegularExpression (PCRE), optimized (JIT-compiled) at creation.
+    """
+
+    name = 'qregularexpression'
+
+    def __init__(self, pattern):
+        Regex.__init__(self, pattern)
+
+        self.regex = QtCore.QRegularExpression(
+            pattern,
+            QtCore.QRegularExpression.UseUnicodePropertiesOption
+        )
+        self.regex.optimize()
+
+    @classmethod
+    def is_available(cls):
+        return QtCore is not None and hasattr(QtCore, 'QRegularExpression')
+
+    def is_valid(self):
+        return self.regex.isValid()
+
+    def search(self, line, pos=0):
+        match = self.regex.match(line, pos)
+        if not match.hasMatch():
+            return None
+
+        return QRegularExpressionMatch(match)
+
+    def spans(self, line, nth):
+        result = []
+        match = self.regex.match(line, 0)
+
+        while match.hasMatch():
+            start = match.capturedStart(nth)
+            end = match.capturedEnd(nth)
+            if start > -1:
+                result.append((start, end -start))
+
+            match = self.regex.match(line, max(end, match.capturedStart() +1))
+
+        return result
+
+
+class QRegExpRegex(Regex):
+    """
+    Qt's legacy QRegExp (backtracking, no JIT), for compatibility.
+    """
+
+    name = 'qregexp'
+
+    def __init__(self, pattern):
+        Regex.__init__(self, pattern)
+        self.regex = QtCore.QRegExp(pattern)
+
+    @classmethod
+    def is_available(cls):
+        return QtCore is not None and hasattr(QtCore, 'QRegExp')
+
+    def is_valid(self):
+        return self.regex.isValid()
+
+    def search(self, line, pos=0):
+        if self.regex.indexIn(line, pos) == -1:
+            return None
+
+        return QRegExpMatch(self.regex)
+
+    def spans(self, line, nth):
+        result = []
+        index = self.regex.indexIn(line, 0)
+
+        while index >= 0:
+            start = self.regex.pos(nth)
+            length = len(self.regex.cap(nth))
+            if start > -1:
+                result.append((start, length))
+
+            index = self.regex.indexIn(line, max(start +length, index +1))
+
+        return result
+
+
+class PrefilteredRegex(Regex):
+    """
+    Compiled expression only run on lines containing its <required> literal
+    (see grammar 'requires' keys), as lines it can not match may still cost a
+    lot of backtracking.
+    """
+
+    def __init__(self, regex, required):
+        """
+        Args:
+            regex (Regex)
+            required (str) : literal every match contains
+        """
+
+        Regex.__init__(self, regex.pattern)
+
+        self.regex = regex
+        self.required = required
+        self.name = regex.name
+        self.thread_safe = regex.thread_safe
+
+    def is_valid(self):
+        return self.regex.is_valid()
+
+    def search(self, line, pos=0):
+        if not self.required in line:
+            return None
+        return self.regex.search(line, pos)
+
+    def spans(self, line, nth):
+        if not self.required in line:
+            return []
+        return self.regex.spans(line, nth)
+
+
+class QRegularExpressionMatch(object):
+    """
+    re.Match-like wrapper of QtCore.QRegularExpressionMatch.
+    """
+
+    def __init__(self, match):
+        self.match = match
+        self.lastindex = match.lastCapturedIndex() or None
+
+    def start(self, nth=0):
+        return self.match.capturedStart(nth)
+
+    def end(self, nth=0):
+        return self.match.capturedEnd(nth)
+
+    def span(self, nth=0):
+        return self.start(nth), self.end(nth)
+
+    def group(self, nth=0):
+        return self.match.captured(nth)
+
+
+class QRegExpMatch(object):
+    """
+    re.Match-like snapshot of a QtCore.QRegExp's last match (as QRegExp objects
+    are reused for next searches).
+    """
+
+    def __init__(self, regex):
+        count = regex.captureCount() +1
+
+        self.starts = [regex.pos(i) for i in range(count)]
+        self.groups = [regex.cap(i) for i in range(count)]
+
+        self.lastindex = None
+        for i in range(count -1, 0, -1):
+            if self.starts[i] > -1:
+                self.lastindex = i
+                break
+
+    def start(self, nth=0):
+        return self.starts[nth]
+
+    def end(self, nth=0):
+        if self.starts[nth] == -1:
+            return -1
+        return self.starts[nth] +len(self.groups[nth])
+
+    def span(self, nth=0):
+        return self.start(nth), self.end(nth)
+
+    def group(self, nth=0):
+        return self.groups[nth]
+
+
+BACKENDS = dict(
+    (cls.name, cls) for cls in (ReRegex, QRegularExpressionRegex, QRegExpRegex)
+)
+
+
+def get_backend(language):
+    """
+    Args:
+        language (str) : 'python', 'mel' or 'log'
+
+    Returns:
+        (str) : <language>'s backend name from kk.REGEX_BACKENDS, or the first
+                available one from kk.REGEX_BACKENDS_FALLBACK
+    """
+
+    names = [kk.REGEX_BACKENDS.get(language)] +kk.REGEX_BACKENDS_FALLBACK
+
+    for name in names:
+        if name in BACKENDS and BACKENDS[name].is_available():
+            return name
+
+    return ReRegex.name
+
+def get_regex(pattern, backend=None, required=None):
+    """
+    Args:
+        pattern (str)
+        backend (str, optional) : backend name, 're' by default
+        required (str, optional) : literal every match contains, to skip lines
+                                   with no such literal (see PrefilteredRegex)
+
+    Returns:
+        (Regex)
+
+    Get the compiled <pattern>, compiling it only on first request. Patterns
+    <backend> can not compile (like look-behinds with QRegExp) fall back to re.
+    """
+
+    if required:
+        return PrefilteredRegex(get_regex(pattern, backend), required)
+
+    backend = backend or ReRegex.name
+    key = (backend, pattern)
+
+    if not key in REGEX_CACHE:
+        regex = BACKENDS[backend](pattern)
+        if not regex.is_valid():
+            regex = get_regex(pattern, ReRegex.name)
+
+        REGEX_CACHE[key] = regex
+
+    return REGEX_CACHE[key]
+
+def compare_backends(lines, patterns=None, repeat=3):
+    """
+    Args:
+        lines (list[str])
+        patterns (list[str], optional) : every pattern compiled so far by
+                                         default (highlighters' ones)
+        repeat (int, optional)
+
+    Returns:
+        (dict) : {backend name: (best time in seconds, mismatching spans count)}
+
+    Time each available backend on every pattern and line, and check their
+    spans against re ones. Results are also printed, fastest first.
+    """
+
+    if patterns is None:
+        patterns = sorted(set(pattern for _, pattern in REGEX_CACHE))
+
+    names = [name for name, cls in BACKENDS.items() if cls.is_available()]
+    reference = [
+        get_regex(pattern, ReRegex.name).spans(line, 0)
+        for pattern in patterns for line in lines
+    ]
+
+    result = {}
+
+    for name in names:
+        regexes = [get_regex(pattern, name) for pattern in patterns]
+        best_time = None
+
+        for _ in range(repeat):
+            start_time = time.time()
+            spans = [regex.spans(line, 0) for regex in regexes for line in lines]
+            spent = time.time() -start_time
+
+            if best_time is None or spent < best_time:
+                best_time = spent
+
+        mismatches = sum(1 for a, b in zip(spans, reference) if a != b)
+        result[name] = (best_time, mismatches)
+
+    for name in sorted(result, key=lambda x: result[x][0]):
+        print (kk.INFO_MESSAGE.format(
+            '{} : {:.3f}s, {} mismatching spans'.format(name, *result[name])
+        ))
+
+    return result
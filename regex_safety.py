@@ -0,0 +1,244 @@
+"""
+Catastrophic backtracking harness for highlighting rules, out of Maya (Qt-free) :
+
+    python regex_safety.py
+    python regex_safety.py --budget 5 --length 2000
+
+Every pattern of every rule class (regular, message, blocking and delimiters
+rules) and the MEL/Python line detectors are run on generated pathological
+lines of growing length : long runs of whitespaces, word characters and the
+pattern's own literals, with no closing match. Patterns exceeding the per-line
+budget are reported, and the exit code is 1 if there is any.
+"""
+
+import os
+import re
+import sys
+import time
+import argparse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if not ROOT in sys.path:
+    sys.path.append(ROOT)
+
+from custom_script_editor import constants as kk
+from custom_script_editor import grammar
+from custom_script_editor import highlight_rules
+
+
+# runs repeated in generated lines, on top of the pattern's own literals
+FILLERS = [' ', '\t', 'a', '_', '1', 'a ', 'a_1 ', '. ', ', ', '"', "'", '\\', '<', '>', '(', '#', '/', '$', '-', '`']
+# lines length growth, slow enough for exponential patterns to exceed the
+# budget before they freeze the harness
+GROWTH = 1.25
+MIN_LENGTH = 8
+
+# escape sequences of character classes and anchors (\b, \s, \w...)
+CLASS_ESCAPE_REGEX = re.compile('\\\\[a-zA-Z]')
+LITERAL_WORD_REGEX = re.compile('[A-Za-z_][A-Za-z_ ]*[A-Za-z_]')
+
+
+def get_rule_classes():
+    """
+    Returns:
+        (list[class]) : every Rule subclass, and the rule classes of grammar
+                        files with no dedicated class
+    """
+
+    classes = []
+    pending = [highlight_rules.Rule]
+
+    while pending:
+        cls = pending.pop(0)
+        for sub_class in cls.__subclasses__():
+            if not sub_class in classes:
+                classes.append(sub_class)
+                pending.append(sub_class)
+
+    grammars = set(cls.grammar for cls in classes)
+    classes.extend(
+        highlight_rules.get_rule_class(language)
+        for language in grammar.get_languages() if not language in grammars
+    )
+
+    return classes
+
+def get_checks(rule):
+    """
+    Args:
+        rule (highlight_rules.Rule)
+
+    Returns:
+        (list[tuple(str, str, callable)]) : rule kind, pattern and function
+                                            applying it on a line, for each of
+                                            <rule>'s patterns
+    """
+
+    if isinstance(rule, highlight_rules.PythonTokenRule):
+        # (tokens are matched one after another)
+        pattern = highlight_rules.PYTHON_TOKEN_REGEX
+        return [('tokenizer', pattern.pattern, lambda line: list(pattern.finditer(line)))]
+
+    checks = []
+
+    for pattern, nth, _ in rule.rules:
+        if isinstance(pattern, highlight_rules.WordSet):
+            continue
+        checks.append(('rule', pattern.pattern, lambda line, p=pattern, n=nth: p.spans(line, n)))
+
+    classifier = getattr(rule, 'message_classifier', None)
+    if classifier and classifier.regex:
+        # (applied on lowered lines)
+        checks.append((
+            'message',
+            classifier.regex.pattern,
+            lambda line, c=classifier: c.classify(line.lower())
+        ))
+
+    for pattern, _, _ in getattr(rule, 'blocking_rules', ()):
+        checks.append(('blocking', pattern.pattern, lambda line, p=pattern: p.search(line)))
+
+    for pattern in [rule.delim_regex] +list(rule.close_regexes):
+        if pattern:
+            checks.append(('delimiter', pattern.pattern, lambda line, p=pattern: p.search(line)))
+
+    return checks
+
+def get_fillers(pattern):
+    """
+    Args:
+        pattern (str)
+
+    Returns:
+        (list[str]) : runs to repeat in <pattern>'s fuzzed lines
+    """
+
+    stripped = CLASS_ESCAPE_REGEX.sub(' ', pattern)
+    words = LITERAL_WORD_REGEX.findall(stripped)
+
+    fillers = list(FILLERS)
+    for word in words:
+        for filler in (word +' ', ' ' +word, word +'('):
+            if not filler in fillers:
+                fillers.append(filler)
+
+    return fillers
+
+def generate_lines(pattern, length):
+    """
+    Args:
+        pattern (str)
+        length (int) : lines length
+
+    Returns:
+        (list[tuple(str, str)]) : lines of <length> characters, with the filler
+                                  each line is made of
+    """
+
+    words = LITERAL_WORD_REGEX.findall(CLASS_ESCAPE_REGEX.sub(' ', pattern))
+    prefixes = [''] +['{} '.format(word) for word in words] +['<', '//', '#']
+
+    lines = []
+    for filler in get_fillers(pattern):
+        for prefix in prefixes:
+            body = filler *(length //len(filler) +1)
+            # (an unmatched character at the end, for the pattern to backtrack)
+            lines.append((filler, (prefix +body)[:length -1] +'!'))
+
+    return lines
+
+def check_function(function, pattern, budget, max_length):
+    """
+    Args:
+        function (callable) : applies the checked pattern on a line
+        pattern (str) : pattern, for lines generation
+        budget (float) : seconds
+        max_length (int)
+
+    Returns:
+        (tuple(float, int, str) or None) : time spent, line length and filler
+                                           of the first line exceeding <budget>
+
+    Run <function> on lines of growing length, up to <max_length> characters.
+    """
+
+    length = MIN_LENGTH
+    while True:
+        for filler, line in generate_lines(pattern, length):
+            start_time = time.time()
+            function(line)
+            spent = time.time() -start_time
+
+            if spent > budget:
+                return spent, length, filler
+
+        if length >= max_length:
+            return None
+        length = min(int(length *GROWTH) +1, max_length)
+
+def run(budget=None, max_length=None, verbose=False):
+    """
+    Args:
+        budget (float, optional) : ms for each pattern on each line, defaults
+                                   to kk.REGEX_SAFETY_BUDGET
+        max_length (int, optional) : fuzzed lines maximum length, defaults to
+                                     kk.LONG_LINE_THRESHOLD (longer lines only
+                                     get their start highlighted)
+        verbose (bool, optional)
+
+    Returns:
+        (list[tuple(str, str, str, float, int, str)]) : language, rule kind,
+                                                        pattern, time spent,
+                                                        line length and filler
+                                                        of every pattern over
+                                                        budget
+    """
+
+    budget = (budget or kk.REGEX_SAFETY_BUDGET) *0.001
+    max_length = max_length or kk.LONG_LINE_THRESHOLD
+
+    checks = []
+    for cls in get_rule_classes():
+        rule = cls()
+        checks.extend((cls.language,) +check for check in get_checks(rule))
+
+    # (compiled detectors, as lines results are cached)
+    for detector in (highlight_rules.MEL_DETECTOR, highlight_rules.PYTHON_DETECTOR):
+        checks.append(('log', 'detector', detector.regex.pattern, detector.regex.search))
+
+    failures = []
+    done = set()
+
+    for language, kind, pattern, function in checks:
+        if (kind, pattern) in done:
+            continue
+        done.add((kind, pattern))
+
+        if verbose:
+            print ('{}/{} : {}'.format(language, kind, pattern))
+
+        result = check_function(function, pattern, budget, max_length)
+        if result:
+            failures.append((language, kind, pattern) +result)
+
+    for language, kind, pattern, spent, length, filler in failures:
+        print (kk.ERROR_MESSAGE.format(
+            '{}/{} : {:.1f} ms on {} characters line of {!r} : {}'.format(
+                language, kind, spent *1000, length, filler, pattern
+            )
+        ))
+
+    if not failures:
+        print (kk.SUCCESS_MESSAGE.format('{} patterns within budget'.format(len(done))))
+
+    return failures
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Highlighting rules backtracking harness.')
+    parser.add_argument('--budget', type=float, help='ms for each pattern on each line')
+    parser.add_argument('--length', type=int, help='fuzzed lines maximum length')
+    parser.add_argument('--verbose', action='store_true')
+
+    args = parser.parse_args()
+    sys.exit(1 if run(args.budget, args.length, args.verbose) else 0)
@@ -3,7 +3,8 @@ Script for customizing Maya's script editor hightlights.
 """
 
 import os
-import re
+import weakref
+import collections
 
 import traceback
 import datetime
@@ -15,9 +16,24 @@ except ImportError:
 
 from custom_script_editor import constants as kk
 from custom_script_editor import palette
-
-
-BASE_MESSAGES = ['warning', 'success', 'info', 'error']
+from custom_script_editor import highlight_scheduler
+from custom_script_editor import highlight_rules
+# (rules are Qt-free, see highlight_rules)
+from custom_script_editor.highlight_rules import (
+    WordSet,
+    LineFormats,
+    Rule,
+    LogRule,
+    MelRule,
+    PythonRule,
+    PythonTokenRule,
+    is_mel_line,
+    is_python_line
+)
+
+
+# formats shared by highlighters using the same palette (see get_format_table)
+FORMAT_TABLES = weakref.WeakValueDictionary()
 
 
 class CustomHighlighter(QtGui.QSyntaxHighlighter):
@@ -25,6 +41,12 @@ class CustomHighlighter(QtGui.QSyntaxHighlighter):
     Base class for LogHighlighter, PythonHighlighter and MelHighlighter.
     """
 
+    # highlight visible blocks first, the other ones on idle time (see
+    # highlight_scheduler.LazyHighlight)
+    lazy_mode = False
+    # highlight appended text by bursts (see highlight_scheduler.AppendHighlight)
+    append_mode = False
+
     def __init__(self, text_edit):
         """
         Args:
@@ -35,6 +57,20 @@ class CustomHighlighter(QtGui.QSyntaxHighlighter):
 
         QtGui.QSyntaxHighlighter.__init__(self, text_edit)
 
+        # lines highlight results, as style keys
+        self.span_cache = SpanCache()
+
+        self.lazy = None
+        if self.lazy_mode and kk.LAZY_HIGHLIGHT:
+            self.lazy = highlight_scheduler.LazyHighlight(self, text_edit)
+
+        self.append = None
+        if self.append_mode and kk.APPEND_HIGHLIGHT:
+            self.append = highlight_scheduler.AppendHighlight(self)
+
+        # time-sliced rehighlight, on theme and palette changes
+        self.rehighlight_job = highlight_scheduler.RehighlightJob(self)
+
     def highlightBlock(self, line):
         """
         Args:
@@ -47,8 +83,63 @@ class CustomHighlighter(QtGui.QSyntaxHighlighter):
         # time... In this case, just re-intitiate its rules and palettes.
         if not hasattr(self, 'rule'):
             self.init_rule()
+            self.span_cache = SpanCache()
+
+        append = getattr(self, 'append', None)
+        if append and append.defers(self.currentBlock()):
+            # highlighted with the rest of the burst, once output goes quiet
+            self.setCurrentBlockState(highlight_scheduler.FORCED_STATE)
+            append.schedule(self.currentBlock())
+            return
+
+        rule = self.rule
+        previous_state = self.previousBlockState()
+        cached = self.span_cache.get(line, previous_state)
+
+        lazy = getattr(self, 'lazy', None)
+        if lazy and lazy.defers(self.currentBlock()):
+            # only resolve block state, formats will be applied later
+            if cached:
+                state = cached[1]
+            else:
+                state = rule.resolve_state(line, previous_state)
+
+            self.setCurrentBlockState(highlight_scheduler.pending_state(state))
+            lazy.schedule(self.currentBlock())
+            return
+
+        if not cached:
+            cached = rule.highlight(line, previous_state)
+            if not rule.is_truncated():
+                self.span_cache.set(line, previous_state, cached)
+
+        self.setCurrentBlockState(cached[1])
+        self.apply_spans(cached[0])
+
+    def apply_spans(self, spans):
+        """
+        Args:
+            spans (list[tuple(int, int, tuple)]) : see
+                                                   highlight_rules.LineFormats.get_spans
+
+        Apply spans with the current palette formats (one setFormat call per
+        span).
+        """
+
+        formats = self.formats
 
-        self.rule.apply(line)
+        for start, length, style in spans:
+            txt_format = formats.get(style)
+            if txt_format is not None:
+                self.setFormat(start, length, txt_format)
+
+    def previousBlockState(self):
+        """
+        Qt re-implementation, ignoring lazy highlight's pending flag.
+        """
+
+        state = QtGui.QSyntaxHighlighter.previousBlockState(self)
+        return highlight_scheduler.resolved_state(state)
 
     def set_theme(self, theme):
         """
@@ -62,9 +153,46 @@ class CustomHighlighter(QtGui.QSyntaxHighlighter):
         self.update_rule()
 
     def update_rule(self):
-        """ Update rule and force highlight to refresh. """
-        self.rule.update()
-        self.rehighlight()
+        """ Update formats and force highlight to refresh. """
+
+        # (patterns disabled by a pathological line get another chance)
+        highlight_rules.reset_runaway_patterns()
+
+        self.update_formats()
+        self.schedule_rehighlight()
+
+    def get_palettes(self):
+        """
+        Returns:
+            (list[palette.Palette]) : palettes of the styles painted by rule
+        """
+
+        return [self.palette]
+
+    def update_formats(self):
+        """
+        Get formats matching the current palettes, for the style keys painted
+        by rule.
+        """
+
+        # (keeps shared tables referenced)
+        self.format_tables = [get_format_table(p) for p in self.get_palettes()]
+
+        if len(self.format_tables) == 1:
+            self.formats = self.format_tables[0]
+        else:
+            self.formats = {}
+            for format_table in self.format_tables:
+                self.formats.update(format_table)
+
+    def schedule_rehighlight(self):
+        """
+        Rehighlight the whole document by time slices, without blocking the UI
+        (cancels any rehighlight still running, see
+        highlight_scheduler.RehighlightJob).
+        """
+
+        self.rehighlight_job.start()
 
 
 
@@ -73,6 +201,8 @@ class LogHighlighter(CustomHighlighter):
     Syntax highlighter for the log panel (MEL/Python/log rules).
     """
 
+    append_mode = True
+
     def __init__(self, text_edit):
         """
         Args:
@@ -91,12 +221,11 @@ class LogHighlighter(CustomHighlighter):
         # last for no-padding (see Palette)
         self.palette = palette.LogPalette(text_edit)
 
-        self.rule = LogRule(
-            self,
-            self.palette,
-            self._python_palette,
-            self._mel_palette
-        )
+        self.rule = LogRule()
+        self.update_formats()
+
+    def get_palettes(self):
+        return [self._mel_palette, self._python_palette, self.palette]
 
 
 class MelHighlighter(CustomHighlighter):
@@ -104,6 +233,8 @@ class MelHighlighter(CustomHighlighter):
     Syntax highlighter for MEL tabs.
     """
 
+    lazy_mode = True
+
     def __init__(self, text_edit):
         """
         Args:
@@ -118,7 +249,8 @@ class MelHighlighter(CustomHighlighter):
             text_edit = self.parent()
 
         self.palette = palette.MelPalette(text_edit)
-        self.rule = MelRule(self, self.palette)
+        self.rule = MelRule()
+        self.update_formats()
 
 
 class PythonHighlighter(CustomHighlighter):
@@ -126,12 +258,16 @@ class PythonHighlighter(CustomHighlighter):
     Syntax highlighter for Python tabs.
     """
 
-    def __init__(self, text_edit):
+    lazy_mode = True
+
+    def __init__(self, text_edit, engine=None):
         """
         Args:
             text_edit (QTextEdit)
+            engine (str, optional) : 'regex' or 'tokenizer' (see set_engine)
         """
 
+        self.engine = engine or kk.PYTHON_HIGHLIGHT_ENGINE
         self.init_rule(text_edit)
         CustomHighlighter.__init__(self, text_edit)
 
@@ -140,668 +276,156 @@ class PythonHighlighter(CustomHighlighter):
             text_edit = self.parent()
 
         self.palette = palette.PythonPalette(text_edit)
-        self.rule = PythonRule(self, self.palette)
-
-
-class Rule(object):
-    """
-    Base class for highlighting rules. Must be re-implemented.
-    """
-
-    docstr_chars = []
-    docstr_close_chars = []
-    cmnt_chars = []
-    str_chars = []
-
-    def __init__(self, highlighter, rule_palette):
-
-        self.highlighter = highlighter
-        self.palette = rule_palette
-        self.styles = self.palette.char_formatted()
-        self.rules = self.get_rules()
-
-        self.delim_strings = self.docstr_chars +self.str_chars +self.cmnt_chars
-        self.docstr_states = [i for i, _ in enumerate(self.docstr_chars)]
-        self.str_states = [i +len(self.docstr_chars) for i, _ in enumerate(self.str_chars)]
-        self.comment_states = [
-            i +len(self.docstr_chars) +len(self.str_chars) for i, _ in enumerate(self.cmnt_chars)
-        ]
-
-        self.map_methods()
-
-    def update(self):
-        self.styles = self.palette.char_formatted()
-        self.rules = self.get_rules()
-
-        if hasattr(self, 'blocking_rules'):
-            self.blocking_rules = self.get_blocking_rules()
-        if hasattr(self, 'message_rules'):
-            self.message_rules = self.get_message_rules()
-
-    def apply_rule(self, line, expression, nth, txt_format):
-        """
-        Args:
-            line (str)
-            expression (QtCore.QRegExp or str)
-            nth (int) : the nth matching group that is to be highlighted
-            txt_format (QtGui.QTextCharFormat)
-
-        Apply <txt_format> on segments that matches <expression> in <line>.
-
-        """
-
-        expression = QtCore.QRegExp(expression)
-        index = expression.indexIn(line, 0)
-
-        while index >= 0:
-            # we want the index of the nth match
-            index = expression.pos(nth)
-            length = len(expression.cap(nth))
-            # set segment format
-            self.setFormat(index, length, txt_format)
-            index = expression.indexIn(line, index + length)
-
-    def apply(self, line):
-        """
-        Args:
-            line (str)
-
-        Apply all defined rules on line.
-        """
-
-        # straight-forward regex rules, no block state used
-        for pattern, nth, txt_format in self.rules:
-            self.apply_rule(line, pattern, nth, txt_format)
-
-        # strings, docstrings and comments rules, using block states to propagate
-        # un-closed rules from one line to another
-        self.apply_multiline_style(line)
-
-    def get_rules(self):
-        """ Returns empty list by default. """
-        return []
-
-    def apply_multiline_style(self, line):
-        """
-        Args:
-            line (str)
-
-        Apply strings, docstrings and comments highlight on line.
-        """
-
-        # propagate previous line's state
-        self.setCurrentBlockState(self.previousBlockState())
-
-        offset = 99999999999
-        start = 0
-        pos = 0
-
-        while len(line) > pos > -1:
-            # get current delimiter
-            state = self.currentBlockState()
-            delim_str = self.delim_strings[state] if state > -1 else None
-
-            # switch to docstring closing char
-            if self.currentBlockState() in self.docstr_states:
-                delim_idx = self.docstr_chars.index(delim_str)
-                delim_str = self.docstr_close_chars[delim_idx]
+        self.rule = self.get_rule_class()()
+        self.update_formats()
 
-                        ############################
-                        #   No state is going on   #
-                        ############################
-
-            # if no current delimiter, get the next delimiter in line
-            if delim_str is None:
-                positions = [QtCore.QRegExp(x).indexIn(line, pos) for x in self.delim_strings]
-
-                # no more delimiter in line
-                if all(x == -1 for x in positions):
-                    break
-
-                positions = [x +offset if x == -1 else x for x in positions]
-                pos = min(positions)
-
-                # if found delimiter is escaped, search again
-                if self.is_escaped(line, pos):
-                    pos +=1
-                    continue
-
-                # "open" current state and delimiter
-                state = positions.index(pos)
-                self.setCurrentBlockState(state)
-                delim_str = self.delim_strings[state]
-
-                if state in self.comment_states:      # comments, paint until the end of the line
-                    self.setFormat(pos, len(line) -pos, self.styles['comments'])
-                    self.setCurrentBlockState(-1)
-                    return          # there's no need for further analysis in this line
-
-                # "open" str (set painting start position)
-                start = pos
-                pos += len(delim_str.replace('\\', ''))
-
-
-                    ######################################
-                    #   Some state is already going on   #
-                    ######################################
-
-            # else, search for the next occurence of the current delimiter in line
-            else:
-                next_pos = QtCore.QRegExp(delim_str).indexIn(line, pos)
-
-                # not found
-                if next_pos == -1:
-                    # check for comments after a \-propagated string
-                    comment_pos = QtCore.QRegExp('#').indexIn(line, pos)
-                    # comments found
-                    if comment_pos and self.currentBlockState() in self.str_states:
-                        # last character before was a non-escaped \
-                        if self.last_util_char(line, comment_pos) == '\\':
-                            self.paint_string(start, comment_pos-1 -start, line)
-                            self.setFormat(
-                                comment_pos,
-                                len(line) -comment_pos,
-                                self.styles['comments']
-                            )
-                            return
-                    break
-
-                # closing char is escaped
-                if self.is_escaped(line, next_pos):
-                    self.paint_string(start, next_pos -start, line)
-                    pos = next_pos +1
-                    continue
-
-                # "close" and paint string
-                self.paint_string(start, next_pos +len(delim_str.replace('\\', '')) -start -1, line)
-                self.setCurrentBlockState(-1)
-                pos = next_pos +len(delim_str.replace('\\', ''))
-
-        ##############################################################
-        #   after iterations (current state may still be "opened")   #
-        ##############################################################
-
-        if self.currentBlockState() == -1:
-            return
-
-        # comments (those after \ string-propagation are handled higher)
-        if self.currentBlockState() in self.comment_states:
-            self.setFormat(start, len(line) -start -1, self.styles['comments'])
-            self.setCurrentBlockState(-1)
-
-        elif self.currentBlockState() in self.str_states:
-            # no string-propagation
-            if line[-1] != '\\':
-                self.setCurrentBlockState(-1)
-            else:
-                self.paint_string(start, len(line) -start -1, line)
-                self.setFormat(len(line)-1, 1, self.styles['special'])
-        # triple-quotes
-        else:
-            self.paint_string(start, len(line) -start -1, line)
-
-    def last_util_char(self, line, pos):
-        """
-        Args:
-            line (str)
-            pos (int)
-
-        Returns:
-            (str or None)
-
-        Perform backward-lookup from <pos> in line for the first non-whitespace
-        character.
-        Return None if this character is escaped.
+    def get_rule_class(self):
         """
-
-        line = line[:pos]
-
-        while line:
-            if not re.match('\s', line[-1]):
-                # return None if char is escaped
-                if self.is_escaped(line, len(line)-1):
-                    return
-
-                return line[-1]
-
-            line = line[:-1]
-
-    def is_escaped(self, line, pos):
-        """
-        Args:
-            line (str)
-            pos (int)
-
         Returns:
-            (bool)
+            (class) : PythonRule or PythonTokenRule
 
-        Check the escaped state of the character at <pos> in <line>.
+        Get the rule class matching the highlighter's engine.
         """
 
-        escaped = False
-
-        while pos:
-            if line[pos-1] == '\\':
-                escaped = not escaped
-                pos -= 1
-            else:
-                break
-
-        return escaped
+        if getattr(self, 'engine', None) == 'tokenizer':
+            return PythonTokenRule
+        return PythonRule
 
-    def paint_string(self, start, count, line):
+    def set_engine(self, engine):
         """
         Args:
-            start (int) : string start pos in <line>
-            count (int) : number of character to paint
-            line (str)
+            engine (str) : 'regex' (PythonRule) or 'tokenizer' (PythonTokenRule)
 
-        Returns:
-            None
-
-        Set each charcater's style from start to end, checking if it is escaped
-        or not.
+        Switch highlighting engine and force highlight to refresh.
         """
 
-        for i in range(start, start +count +1):
-            # skip whitespaces, as they don't need to be painted, and must be
-            # considered as escaped characters for "special" style painting.
-            if re.match('\s', line[i]):
-                continue
-
-            if not self.is_escaped(line, i):
-                self.setFormat(i, 1, self.styles['string'])
-            else:
-                self.setFormat(i-1, 2, self.styles['special'])
-
-    def map_methods(self):
-        """ Simplify methods acces by creating aliases. """
+        if engine == self.engine:
+            return
 
-        self.setFormat = self.highlighter.setFormat
-        self.setCurrentBlockState = self.highlighter.setCurrentBlockState
-        self.currentBlockState = self.highlighter.currentBlockState
-        self.previousBlockState = self.highlighter.previousBlockState
+        # (worker results of the other engine would refill the span cache,
+        # with states that mean something else)
+        background = self.lazy.background if self.lazy else None
+        if background:
+            background.cancel()
 
+        self.engine = engine
+        self.rule = self.get_rule_class()()
+        self.span_cache.clear()
+        self.schedule_rehighlight()
 
 
-class LogRule(Rule):
+class SpanCache(object):
     """
-    Syntax highlighter for Maya Script Editor's log panel. This class has its
-    own specific rules, and also uses MEL and Python ones.
+    Highlight results of already highlighted lines, as style keys spans, so
+    lines are not evaluated again when only the theme or the palette changes.
+    Least recently used entries are dropped above <size> entries.
+
+    Entries are keyed by the line's hash and length, not by the line itself, so
+    the cache does not keep long log lines alive. Two different lines of same
+    hash, length and previous state would share their spans : with 64 bits
+    hashes, this is left to chance.
     """
 
-    def __init__(self, highlighter, log_palette, python_palette, mel_palette):
+    def __init__(self, size=None):
         """
         Args:
-            highlighter (LogHighlighter)
-            palette (palette.Palette)
-        """
-
-        Rule.__init__(self, highlighter, log_palette)
-
-        self.current_rule = 'log'
-
-        self.rules = self.get_rules()
-        self.blocking_rules = self.get_blocking_rules()
-        self.message_rules = self.get_message_rules()
-
-        self.mel_rules = MelRule(highlighter, mel_palette)
-        self.python_rules = PythonRule(highlighter, python_palette)
-
-    def get_blocking_rules(self):
-        """
-        Returns:
-            (list[tuple(QtCore.QRegExp, int, QtGui.QTextCharFormat)])
-
-        These rules are applied prior to MEL and Python rules. If any rule was
-        used, all MEL, Python and self rules will be ignored.
-        """
-
-        # printed Python modules or methods (like <module 'maya' from '...'>)
-        # rule, if not in string.
-        rules = [
-            (
-                '(?<![\"\'])(<\s*\w+\s+\'.+\'\s+from\s+\'.+\'>)(?![\"\'])',
-                1,
-                self.styles['special']
-            )
-        ]
-
-        # printed Python objects (like <PySide2.QtWidgets.QWidget) rule if
-        # not in string.
-        rules = [
-            (
-                '(?<![\"\'])(<\s*.+\s+object at\s+.+>\s*)(?![\"\'])',
-                1,
-                self.styles['special']
-            )
-        ]
-
-        return rules
-
-    def get_message_rules(self):
-        """
-        Returns:
-            (list[tuple(QtCore.QRegExp, QtGui.QTextCharFormat)])
-
-        Get all message rules. These are applied on the whole line, analysing the
-        line with no case match.
+            size (int, optional) : defaults to kk.SPAN_CACHE_SIZE
         """
 
-        # set info, warning, error and success messages rules
-        rules = [
-            (
-                '^\s*%(char)s(.)+(%(type)s\s*:)' % {'char': c, 'type': x},
-                self.styles[x]
-            ) for c in ('//', '#') for x in BASE_MESSAGES
-        ]
-
-        # info lines with '//' or '#' at the start of the line
-        rules += [('^\s*%s.*' % c, self.styles['info']) for c in ('//', '#')]
-        # info lines with '//' or '#' at the end of the line
-        rules += [('.*%s\s*$' % c, self.styles['info']) for c in ('//', '#')]
-
-        # info lines with '[] msg:' at the start of the line
-        rules += [
-            ('^\s*\[\w+\]\s*(%s\s*:)' % x, self.styles[x]) for x in BASE_MESSAGES
-        ]
+        self.size = size or kk.SPAN_CACHE_SIZE
+        self.entries = collections.OrderedDict()
 
-        return rules
-
-    def apply(self, line):
+    def get(self, line, previous_state):
         """
         Args:
             line (str)
+            previous_state (int)
 
-        Apply syntax highlighting rules to the given line.
+        Returns:
+            (tuple or None) : spans, and block state
         """
 
-        try:
-            if self.traceback_applied(line):
-                return
-
-            # apply message rules, and skip next if some rule matches (as applied
-            # on the whole line)
-            for pattern, txt_format in self.message_rules:
-                if re.match(pattern, line.lower()):
-                    self.setFormat(0, len(line), txt_format)
-                    self.current_rule = 'log'
-                    return
-
-            block_next = False
-            # apply blocking rules
-            for pattern, nth, txt_format in self.blocking_rules:
-                match = re.search(pattern, line)
-
-                if match:
-                    start = match.start(nth)
-                    end = match.end(nth)
-                    self.setFormat(start, end -start, txt_format)
-                    block_next = True
+        key = get_cache_key(line, previous_state)
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.entries[key] = entry
 
-            if block_next:
-                return
+        return entry
 
-            if is_mel_line(line):
-                if not self.current_rule in ('log', 'MEL'):
-                    # interrupt potential opened docstrings
-                    self.setCurrentBlockState(-1)
-                self.current_rule = 'MEL'
-
-            elif is_python_line(line):
-                if not self.current_rule in ('log', 'Python'):
-                    # interrupt potential opened docstrings
-                    self.setCurrentBlockState(-1)
-                self.current_rule = 'Python'
-
-            if self.current_rule == 'MEL':
-                self.mel_rules.apply(line)
-            elif self.current_rule == 'Python':
-                self.python_rules.apply(line)
-
-            # apply overall rules
-            for pattern, nth, txt_format in self.rules or ():
-                self.apply_rule(line, pattern, nth, txt_format)
-
-        # silent errors so we don't fall into a print loop...
-        except:
-            pass
-
-    def apply_multiline_style(self, line):
-        return
-
-    def traceback_applied(self, line):
+    def set(self, line, previous_state, entry):
         """
         Args:
             line (str)
-
-        Handle Tracebacks (block state = 5).
+            previous_state (int)
+            entry (tuple) : spans, and block state
         """
 
-        # propagate previous line's state
-        self.setCurrentBlockState(self.previousBlockState())
+        self.entries[get_cache_key(line, previous_state)] = entry
 
-        if re.match('^(#\s)*Traceback', line):
-            self.setCurrentBlockState(5)
-            self.setFormat(0, len(line), self.styles['traceback'])
-            return True
+        if len(self.entries) > self.size:
+            self.entries.popitem(last=False)
 
-        if self.currentBlockState() == 5:
-            if re.match('^(#\s)*\s+', line):
-                self.setFormat(0, len(line), self.styles['traceback'])
-                return True
-            else:
-                self.setCurrentBlockState(-1)
+    def clear(self):
+        self.entries.clear()
 
-        return False
 
 
-class MelRule(Rule):
+class FormatTable(dict):
     """
-    Syntax highlighter for the MEL language.
+    {style key: QtGui.QTextCharFormat} dict of a palette's formats, shared by
+    every highlighter using the same theme and colors (see get_format_table).
+    Entries are dropped from FORMAT_TABLES as soon as no highlighter uses them
+    anymore.
     """
 
-    docstr_chars = ['/\\*']
-    docstr_close_chars = ['\\*/']
-    cmnt_chars = ['//']
-    str_chars = ['"']
-
-    def get_rules(self):
-        """
-        Returns:
-            (list[tuple(QtCore.QRegExp, int, QtGui.QTextCharFormat)])
-
-        Get all MEL rules, except for comments, strings and triple-quotes,
-        that will be handled differently.
-        """
-
-        # digits rule
-        rules = [('\\b\d+\\b', 0, self.styles['numbers'])]
 
-        rules += [('^\s*\w+', 0, self.styles['called'])]
-        rules += [('-(\w+)', 1, self.styles['flags'])]
-        rules += [('(\"\w*\")', 1, self.styles['string'])]
+def get_cache_key(line, previous_state):
+    """
+    Args:
+        line (str)
+        previous_state (int)
 
-        # $variables rules
-        rules += [('\$\w+', 0, self.styles['variables'])]
+    Returns:
+        (tuple) : SpanCache key
+    """
 
-        # add MEL keywords rules
-        rules += [('\\b(%s)\\b' % w, 0, self.styles['keyword']) for w in kk.MEL_KEYWORDS]
-        # add MEL numbers rules
-        rules += [('\\b(%s)\\b' % n, 0, self.styles['numbers']) for n in kk.MEL_NUMBERS]
-        # add MEL builtins rules
-        rules += [('\\b(%s)\\b' % n, 0, self.styles['special']) for n in kk.MEL_BUILTINS]
-        # add operators rules
-        rules += [('%s' % o, 0, self.styles['operator']) for o in kk.OPERATORS]
+    return (hash(line), len(line), previous_state)
 
-        # declared procedures rule
-        rules += [ ('(\\bproc\\b\s+)(.+\s+)*(\w+)\s*\(', 3, self.styles['proc_name']),]
+def get_format_table(rule_palette):
+    """
+    Args:
+        rule_palette (palette.Palette)
 
-        # expressions between ``
-        rules += [('(`.*`)', 1, self.styles['called_expr'])]
+    Returns:
+        (FormatTable)
 
-        # set '.' on float back to numbers style
-        rules += [('\d+\.*\d+', 0, self.styles['numbers'])]
-        # set ',' back to normal
-        rules += [(',', 0, self.styles['normal'])]
+    Get formats for <rule_palette>'s style keys, built only if no other
+    highlighter uses the same palette.
+    """
 
-        return rules
+    language = rule_palette.root_type
+    colors = tuple(sorted(
+        (attr, tuple(rgb)) for attr, rgb in (rule_palette.palette or {}).items()
+    ))
+    key = (language, rule_palette.theme, colors)
+
+    format_table = FORMAT_TABLES.get(key)
+    if format_table is None:
+        format_table = FormatTable(
+            ((language, attr), txt_format)
+            for attr, txt_format in rule_palette.char_formatted().items()
+        )
+        FORMAT_TABLES[key] = format_table
 
+    return format_table
 
-class PythonRule(Rule):
+def schedule_warnings():
     """
-    Syntax highlighter for the Python language.
+    Print rules warnings once back to the event loop, rather than from within
+    a highlight (the log panel may be the highlighted document).
     """
 
-    docstr_chars = ["'''", '"""']
-    docstr_close_chars = ["'''", '"""']
-    cmnt_chars = ['#']
-    str_chars = ["'", '"']
+    QtCore.QTimer.singleShot(0, highlight_rules.print_warnings)
 
-    def get_rules(self):
-        """
-        Returns:
-            (list[tuple(QtCore.QRegExp, int, QtGui.QTextCharFormat)])
-
-        Get all Python rules, except for comments, strings and triple-quotes,
-        that will be handled differently.
-        """
-
-        # digits rule
-        rules = [('\\b\d+\\b', 0, self.styles['numbers'])]
-
-        # python "self" rule
-        rules += [('\\b(self)\\b', 0, self.styles['self'])]
-        # python "builtins" words rules
-        rules += [('\\b%s\\b' % x, 0, self.styles['special']) for x in kk.PYTHON_BUILTINS]
-
-        # inherited classes rule
-        rules += [('(\\bclass\\b\s*_*\w+_*\s*\()(.+)(\))', 2, self.styles['class_arg'])]
-        # intermediate objects rule
-        rules += [('(\.)(\w+)', 2, self.styles['interm'])]
-        # called functions rule
-        rules += [('(\\b_*\w+_*\s*)(\()', 1, self.styles['called'])]
-        # declared classes rule
-        rules += [('(\\bclass\\b\s*)(_*\w+_*)', 2, self.styles['class_name'])]
-        # declared functions rule
-        rules += [('(\\bdef\\b\s*)(_*\w+_*)', 2, self.styles['def_name'])]
-
-        # python keywords rules
-        rules += [('\\b(%s)\\b' % w, 0, self.styles['keyword']) for w in kk.PYTHON_KEYWORDS]
-        # operators rules
-        rules += [('%s' % o, 0, self.styles['operator']) for o in kk.OPERATORS]
-        # kwarg= rule
-        rules += [('(,\s*|\()(\w+)(\s*=\s*)', 2, self.styles['numbers'])]
-
-        # add numbers rule (called after intermediates sur float would not
-        # be considered as intermediates)
-        rules += [('\\b(%s)\\b' % n, 0, self.styles['numbers']) for n in kk.PYTHON_NUMBERS]
-        # set '.' on float back to numbers style
-        rules += [('\d+\.*\d+', 0, self.styles['numbers'])]
-        # set ',' back to normal
-        rules += [(',', 0, self.styles['normal'])]
-
-        # decorators rule
-        rules += [('\s*\@\w+', 0, self.styles['decorators'])]
-
-        return [(QtCore.QRegExp(pat), index, fmt) for (pat, index, fmt) in rules]
-
-
-
-                    ###########################################
-                    #   detecting MEL lines in console logs   #
-                    ###########################################
-
-def is_mel_line(line):
-    # lines that ends with ";"
-    if re.match('.+;$', line):
-        return True
-    if re.match('^\s*/\\*', line):                      # /* docstrings
-        return True
-    if re.search('(global\s+)*proc', line):             # proc declarations
-        return True
-    if re.match('\$.+\s*\=', line):                     # $variable declaration
-        return True
-    if re.match('for\s*\(.+\)\s*{', line):              # for (...) { declaration
-        return True
-    if re.match("^\s*//", line):                        # comment lines
-        return True
-    if re.search('\\btrue\\b', line):                    # true
-        return True
-    if re.search('\\bfalse\\b', line):                   # false
-        return True
-    if re.search('\\bnone\\b', line):                    # none
-        return True
-
-    loops_regex = '%s\s*\(.+\)\s*\{'
-    if re.search(loops_regex % 'while', line):           # while (...) { declaration
-        return True
-    if re.search(loops_regex % 'for', line):             # for (...) { declaration
-        return True
-    if re.search(loops_regex % 'if', line):              # if (...) { declaration
-        return True
-    if re.search(loops_regex % 'else', line):            # else (...) { declaration
-        return True
-    if re.search(loops_regex % 'else if', line):         # else if (...) { declaration
-        return True
-
-    functions_regex = '%s\s*\(.+\)'
-    if re.search(functions_regex % 'catch', line):           # catch (...) declaration
-        return True
-    if re.search(functions_regex % 'catchQuiet', line):      # catchQuiet (...) declaration
-        return True
-
-    return False
-
-
-                  ##############################################
-                  #   detecting Python lines in console logs   #
-                  ##############################################
-
-
-def is_python_line(line):
-    if re.match('from(.)+import(.)+', line):            # "from" imports
-        return True
-    if re.match('import(.)+', line):                    # imports
-        return True
-    if re.search('(\\bdef\\b\s*)(_*\w+_*)', line):      # function declarations
-        return True
-    if re.search('(\\bclass\\b\s*)(_*\w+_*)', line):    # class declarations
-        return True
-    if re.match('^\s*"""', line):                       # """ docstrings
-        return True
-    if re.match("^\s*'''", line):                       # ''' docstrings
-        return True
-    if re.match("\s*\@\w+\s*", line):                   # decorators
-        return True
-    if re.match("^\s*#", line):                         # comment lines
-        return True
-    if re.search('\\bTrue\\b', line):                   # True
-        return True
-    if re.search('\\bFalse\\b', line):                  # False
-        return True
-    if re.search('\\bNone\\b', line):                   # None
-        return True
-
-    loops_regex = '%s\s*.*\s*:'
-    if re.search(loops_regex % 'while', line):           # while (...) : declaration
-        return True
-    if re.search(loops_regex % 'for', line):             # for (...) : declaration
-        return True
-    if re.search(loops_regex % 'if', line):              # if (...) : declaration
-        return True
-    if re.search(loops_regex % 'else', line):            # else (...) : declaration
-        return True
-    if re.search(loops_regex % 'elif', line):            # else if (...) : declaration
-        return True
-    if re.search(loops_regex % 'try', line):             # try (...) : declaration
-        return True
-    if re.search(loops_regex % 'except', line):          # except (...) : declaration
-        return True
-    if re.search(loops_regex % 'finally', line):         # finally (...) : declaration
-        return True
-
-    if re.search('\s*print\s*(?!\()', line):            # print call without ()
-        return True
-
-    return False
+
+highlight_rules.WARNINGS_SCHEDULER = schedule_warnings